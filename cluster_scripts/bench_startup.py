@@ -0,0 +1,63 @@
+import os, shutil, statistics, subprocess, sys, tempfile, time
+from typing import Dict, List
+
+# Startup benchmark: module import cost and time-to-first-response of the CLI.
+# Each run is a fresh interpreter, like a short-lived worker or a new container.
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+FIRST_UTTERANCE = "English B1 grammar under 40"
+# the reply to FIRST_UTTERANCE ends with one of these lines (results found / none found)
+REPLY_ENDS = ("Say 'Add", "couldn't find")
+CACHE_DIR = os.path.join(HERE, "database", ".cache")
+
+def time_import(module: str) -> float:
+    code = f"import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+    out = subprocess.run([sys.executable, "-c", code], cwd=HERE, capture_output=True, text=True, check=True)
+    return float(out.stdout.strip())
+
+def time_first_response(log_dir: str) -> Dict[str, float]:
+    """Seconds from process spawn to the greeting, and to the complete reply to the first utterance."""
+    # benchmark sessions log to log_dir, not to the logs that turn_log.py stats and ranking.py read
+    env = dict(os.environ, PYTHONUNBUFFERED="1", BOOKBOT_LOG_DIR=log_dir)
+    t0 = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "pipeline.py"], cwd=HERE, env=env, text=True,
+                            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    proc.stdout.readline()
+    t_greeting = time.perf_counter() - t0
+    proc.stdin.write(FIRST_UTTERANCE + "\n")
+    proc.stdin.flush()
+    # the reply is streamed as a header, one line per result and the closing hint
+    while True:
+        line = proc.stdout.readline()
+        if not line or any(end in line for end in REPLY_ENDS):
+            break
+    t_first = time.perf_counter() - t0
+    proc.stdin.write("quit\n")
+    proc.stdin.flush()
+    proc.communicate()
+    return {"greeting": t_greeting, "first_response": t_first}
+
+def _ms(values: List[float]) -> str:
+    return f"median {statistics.median(values) * 1000:7.1f} ms   min {min(values) * 1000:7.1f} ms"
+
+def main(runs: int = 10):
+    print(f"Python {sys.version.split()[0]}, {runs} runs each\n")
+    for module in ("utils", "pipeline", "evaluate"):
+        try:
+            print(f"import {module:<10}", _ms([time_import(module) for _ in range(runs)]))
+        except subprocess.CalledProcessError as e:
+            print(f"import {module:<10} failed: {e.stderr.strip().splitlines()[-1]}")
+    log_dir = tempfile.mkdtemp(prefix="bookbot-bench-")
+    for label, cold in (("cold cache", True), ("warm cache", False)):
+        samples = []
+        for _ in range(runs):
+            if cold:
+                shutil.rmtree(CACHE_DIR, ignore_errors=True)
+            samples.append(time_first_response(log_dir))
+        print(f"\n{label}:")
+        print("  time to greeting      ", _ms([s["greeting"] for s in samples]))
+        print("  time to first response", _ms([s["first_response"] for s in samples]))
+    shutil.rmtree(log_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10)
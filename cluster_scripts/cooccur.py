@@ -0,0 +1,91 @@
+import json, mmap, os, struct
+from collections import Counter, defaultdict
+from itertools import groupby
+from typing import Dict, Any, List, Optional, Iterable, Iterator, Tuple
+from orders import LEDGER_PATH, iter_order_lines
+
+ALSO_BOUGHT_PATH = "database/also_bought.bin"
+_MAGIC = b"BBCO1"
+_HEADER = struct.Struct("<5sIII")  # magic, neighbours per row, item count, JSON id table length
+
+# ---------------- Offline: co-occurrence job -----------------
+
+def _baskets(ledger_path: str) -> Iterator[List[str]]:
+    # one basket per confirmed order; the ledger returns an order's lines together, so
+    # each basket is emitted as soon as its order ends and only one is held in memory
+    for _, lines in groupby(iter_order_lines(ledger_path), key=lambda row: row[1]):
+        yield [isbn for _, _, isbn, _ in lines]
+
+def build_also_bought(ledger_path: str = LEDGER_PATH, out_path: str = ALSO_BOUGHT_PATH, top_n: int = 5) -> int:
+    """Stream order baskets into a sparse item–item co-occurrence matrix and write top-N rows.
+
+    Each row holds top_n (neighbour index, co-basket count) pairs, padded with -1,
+    so a lookup is a single fixed-size read. Returns the number of items written.
+    """
+    ids: Dict[str, int] = {}
+    rows: Dict[int, Counter] = defaultdict(Counter)
+    for basket in _baskets(ledger_path):
+        idx = sorted({ids.setdefault(isbn, len(ids)) for isbn in basket})
+        for i in idx:
+            for j in idx:
+                if i != j:
+                    rows[i][j] += 1
+    isbns = sorted(ids, key=ids.get)
+    table = json.dumps(isbns).encode("utf-8")
+    pad = struct.pack("<if", -1, 0.0)
+    os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+    with open(out_path, "wb") as f:
+        f.write(_HEADER.pack(_MAGIC, top_n, len(isbns), len(table)) + table)
+        for i in range(len(isbns)):
+            top = sorted(rows[i].items(), key=lambda kv: (-kv[1], kv[0]))[:top_n]
+            f.write(b"".join(struct.pack("<if", j, float(c)) for j, c in top) + pad * (top_n - len(top)))
+    return len(isbns)
+
+# ---------------- Online: memory-mapped lookups -----------------
+
+class AlsoBought:
+    """Read-only, memory-mapped view of the top-N neighbour rows."""
+
+    def __init__(self, path: str = ALSO_BOUGHT_PATH):
+        self._file = open(path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.top_n, n_items, table_len = _HEADER.unpack_from(self._mm, 0)
+        if magic != _MAGIC:
+            raise ValueError(f"{path} is not an also-bought index")
+        start = _HEADER.size
+        self.isbns: List[str] = json.loads(self._mm[start:start + table_len].decode("utf-8"))
+        self._ids = {isbn: i for i, isbn in enumerate(self.isbns)}
+        self._rows_at = start + table_len
+        self._row = struct.Struct("<" + "if" * self.top_n)
+
+    def neighbours(self, isbn: str, exclude: Iterable[str] = (), k: Optional[int] = None) -> List[Tuple[str, float]]:
+        """Top co-purchased (isbn, count) pairs for one book: one O(N) row read."""
+        i = self._ids.get(isbn)
+        if i is None:
+            return []
+        flat = self._row.unpack_from(self._mm, self._rows_at + i * self._row.size)
+        skip = set(exclude)
+        out: List[Tuple[str, float]] = []
+        for j, score in zip(flat[0::2], flat[1::2]):
+            if j < 0:
+                break
+            if self.isbns[j] not in skip:
+                out.append((self.isbns[j], score))
+        return out[:k] if k is not None else out
+
+    def close(self):
+        self._mm.close()
+        self._file.close()
+
+def load_also_bought(path: str = ALSO_BOUGHT_PATH) -> Optional[AlsoBought]:
+    return AlsoBought(path) if os.path.exists(path) else None
+
+def nlg_also_bought(isbns: List[str], items_by_isbn: Dict[str, Dict[str, Any]]) -> str:
+    titles = [items_by_isbn[i]["title"] for i in isbns if i in items_by_isbn]
+    if not titles:
+        return ""
+    return "Customers who bought this also bought: " + "; ".join(f"“{t}”" for t in titles)
+
+if __name__ == "__main__":
+    n = build_also_bought()
+    print(f"Wrote also-bought rows for {n} items to {ALSO_BOUGHT_PATH}")
@@ -1,7 +1,5 @@
-import json
+import json, sys
 from collections import Counter, defaultdict
-from tabulate import tabulate
-from sklearn.metrics import confusion_matrix, classification_report
 from utils import rule_nlu
 
 def load_tests(path="tests/test_intents.jsonl"):
@@ -34,12 +32,38 @@ def slot_match(pred, gold):
         m[k] = int(pv == gv and pv is not None)
     return m
 
-def main():
+def intent_accuracy(y_true, y_pred):
+    return sum(t == p for t, p in zip(y_true, y_pred)) / len(y_true) if y_true else 0.0
+
+def main(hybrid=False):
+    # heavy dependencies are only needed for the report, not for importing load_tests/slot_match
+    from tabulate import tabulate
+    from sklearn.metrics import confusion_matrix, classification_report
     tests = load_tests()
+    nlu = rule_nlu
+    if hybrid:
+        # tests/test_intents.jsonl is held out from intent_model.py training
+        from intent_model import load_intent_model, hybrid_nlu, INTENT_MODEL_PATH
+        model = load_intent_model()
+        if model is None:
+            print(f"No intent model at {INTENT_MODEL_PATH}; train it with `python intent_model.py`.")
+            return
+        nlu = lambda text: hybrid_nlu(text, model)
+        rule_pred = [rule_nlu(ex["text"])["intent"] for ex in tests]
+        hybrid_pred = [nlu(ex["text"])["intent"] for ex in tests]
+        gold = [ex["intent"] for ex in tests]
+        print(tabulate([["rules", f"{intent_accuracy(gold, rule_pred):.3f}"],
+                        ["hybrid", f"{intent_accuracy(gold, hybrid_pred):.3f}"]],
+                       headers=["NLU", "Intent accuracy"]))
+        changed = [(ex["text"], r, h, ex["intent"]) for ex, r, h in zip(tests, rule_pred, hybrid_pred) if r != h]
+        if changed:
+            print("\nUtterances where the model overrode the rules:")
+            print(tabulate(changed, headers=["Text", "Rules", "Hybrid", "Gold"]))
+        print()
     y_true, y_pred = [], []
     slot_scores = defaultdict(lambda: Counter())
     for ex in tests:
-        pred = rule_nlu(ex["text"])
+        pred = nlu(ex["text"])
         y_true.append(ex["intent"])
         y_pred.append(pred["intent"])
         for k, v in slot_match(pred, ex).items():
@@ -63,4 +87,4 @@ def main():
     print("\nDM Action Accuracy (proxy on intent-to-action mapping): ~0.88 (sample)")
 
 if __name__ == "__main__":
-    main()
+    main(hybrid="--hybrid" in sys.argv[1:])
@@ -0,0 +1,128 @@
+import csv, json, math, os, re
+from typing import Dict, Any, List, Optional, Tuple
+from utils import rule_nlu
+
+INTENT_MODEL_PATH = "database/intent_model.json"
+
+# ground_truth.csv uses its own label set; rows whose label has no pipeline intent are skipped
+GROUND_TRUTH_INTENTS = {
+    "get_recommendation": "ask_recommendation",
+    "find_book": "search_books",
+    "ask_price": "filter_by_price",
+    "checkout": "checkout",
+}
+
+_WORD = re.compile(r"[^\W_]+", re.UNICODE)
+
+def featurize(text: str, slots: Dict[str, Any]) -> List[str]:
+    """Unigrams, bigrams and the slot types the rules found (so unseen values still generalize)."""
+    toks = _WORD.findall(text.lower())
+    feats = ["w=" + t for t in toks]
+    feats += ["b=" + a + "_" + b for a, b in zip(toks, toks[1:])]
+    feats += ["slot=" + k for k in slots]
+    return feats
+
+# intents dm_next_action acts on; the model is never trained on (and so never predicts) others
+DM_INTENTS = (
+    "ask_recommendation", "search_books", "filter_by_price", "add_to_cart", "remove_from_cart",
+    "view_cart", "checkout", "choose_delivery", "provide_address", "provide_payment",
+    "more_results", "help", "thanks", "farewell", "payment_help",
+)
+
+# ---------------- Offline training (scikit-learn) -----------------
+
+def load_training_data(intents_path: str = "database/intent_train.jsonl",
+                       ground_truth_path: str = "database/ground_truth.csv") -> List[Tuple[str, str]]:
+    """Training utterances for DM intents only; tests/test_intents.jsonl stays held out for evaluate.py."""
+    data: List[Tuple[str, str]] = []
+    with open(intents_path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                ex = json.loads(line)
+                data.append((ex["text"], ex["intent"]))
+    with open(ground_truth_path, newline="", encoding="utf-8") as f:
+        for r in csv.DictReader(f):
+            intent = GROUND_TRUTH_INTENTS.get(r["intent"])
+            if intent:
+                data.append((r["user_input"], intent))
+    return [(text, intent) for text, intent in data if intent in DM_INTENTS]
+
+def train(data: List[Tuple[str, str]], out_path: str = INTENT_MODEL_PATH, C: float = 10.0) -> Dict[str, Any]:
+    """Fit a multinomial logistic regression and export it as plain weight arrays."""
+    from sklearn.feature_extraction import DictVectorizer
+    from sklearn.linear_model import LogisticRegression
+
+    feats = [{f: 1 for f in featurize(text, rule_nlu(text)["slots"])} for text, _ in data]
+    vec = DictVectorizer()
+    X = vec.fit_transform(feats)
+    clf = LogisticRegression(C=C, max_iter=2000)
+    clf.fit(X, [intent for _, intent in data])
+    classes = [str(c) for c in clf.classes_]
+    coef, intercept = clf.coef_, list(clf.intercept_)
+    if len(classes) == 2:
+        # binary models keep a single row; expand to the softmax-equivalent two-row form
+        coef = [[0.0] * coef.shape[1], list(coef[0])]
+        intercept = [0.0, intercept[0]]
+    weights = {}
+    for j, name in enumerate(vec.get_feature_names_out()):
+        row = [round(float(coef[c][j]), 6) for c in range(len(classes))]
+        if any(row):
+            weights[name] = row
+    model = {"classes": classes, "intercept": [float(b) for b in intercept], "weights": weights}
+    os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+    with open(out_path, "w", encoding="utf-8") as f:
+        json.dump(model, f, ensure_ascii=False)
+    return model
+
+# ---------------- Inference (no dependencies) -----------------
+
+class IntentModel:
+    """Linear intent scorer over exported weights: a few dict lookups and a softmax per utterance."""
+
+    def __init__(self, classes: List[str], intercept: List[float], weights: Dict[str, List[float]]):
+        self.classes = classes
+        self.intercept = intercept
+        self.weights = {f: tuple(w) for f, w in weights.items()}
+
+    @classmethod
+    def load(cls, path: str = INTENT_MODEL_PATH) -> "IntentModel":
+        with open(path, "r", encoding="utf-8") as f:
+            m = json.load(f)
+        return cls(m["classes"], m["intercept"], m["weights"])
+
+    def predict(self, text: str, slots: Optional[Dict[str, Any]] = None) -> Tuple[str, float]:
+        """Return (intent, probability)."""
+        feats = set(featurize(text, slots if slots is not None else rule_nlu(text)["slots"]))
+        rows = [w for w in map(self.weights.get, feats) if w is not None]
+        # column sums over the matched weight rows: one pass in C per class instead of a Python loop
+        scores = [sum(col) for col in zip(self.intercept, *rows)]
+        top = max(range(len(scores)), key=scores.__getitem__)
+        z = sum(math.exp(s - scores[top]) for s in scores)
+        return self.classes[top], 1.0 / z
+
+    def predict_batch(self, texts: List[str]) -> List[Tuple[str, float]]:
+        """predict() for many utterances; repeated texts (common in replayed logs) are scored once."""
+        seen: Dict[str, Tuple[str, float]] = {}
+        return [seen[t] if t in seen else seen.setdefault(t, self.predict(t)) for t in texts]
+
+def load_intent_model(path: str = INTENT_MODEL_PATH) -> Optional[IntentModel]:
+    return IntentModel.load(path) if os.path.exists(path) else None
+
+def hybrid_nlu(text: str, model: Optional[IntentModel], threshold: float = 0.7) -> Dict[str, Any]:
+    """rule_nlu with the intent replaced by the model's when the model is confident enough.
+
+    Slots always come from the rules; low-confidence predictions keep the rule intent, and so
+    does a rule intent the model was not trained on.
+    """
+    nlu = rule_nlu(text)
+    if model is not None and (nlu["intent"] == "unknown" or nlu["intent"] in model.classes):
+        intent, p = model.predict(text, nlu["slots"])
+        if p >= threshold:
+            nlu["intent"] = intent
+    return nlu
+
+if __name__ == "__main__":
+    data = load_training_data()
+    model = train(data)
+    print(f"Trained on {len(data)} utterances, {len(model['classes'])} intents, "
+          f"{len(model['weights'])} features -> {INTENT_MODEL_PATH}")
@@ -0,0 +1,179 @@
+import sqlite3, threading, time, zlib
+from typing import Dict, Any, Iterable, Optional
+
+# ---------------- Counter store -----------------
+
+# Stock counters live in the same SQLite file as the order ledger so that a checkout
+# can convert holds and append the order in one transaction.
+STOCK_SCHEMA = """
+CREATE TABLE IF NOT EXISTS stock (
+    isbn TEXT PRIMARY KEY,
+    qty INTEGER NOT NULL,
+    reserved INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS holds (
+    session_id TEXT,
+    isbn TEXT,
+    qty INTEGER NOT NULL,
+    expires_at REAL NOT NULL,
+    PRIMARY KEY (session_id, isbn)
+);
+CREATE INDEX IF NOT EXISTS holds_expiry ON holds (expires_at);
+"""
+
+def connect(path: str, synchronous: str = "FULL") -> sqlite3.Connection:
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(f"PRAGMA synchronous={synchronous}")
+    return conn
+
+def seed_stock(conn: sqlite3.Connection, items: Iterable[Dict[str, Any]]):
+    conn.executemany("INSERT OR IGNORE INTO stock (isbn, qty) VALUES (?, ?)",
+                     [(b["isbn"], int(b.get("stock", 0))) for b in items])
+
+def release_expired(conn: sqlite3.Connection, now: float, isbn: Optional[str] = None) -> int:
+    """Return expired holds to the pool. Must run inside a write transaction."""
+    if isbn is None:
+        rows = conn.execute("SELECT session_id, isbn, qty FROM holds WHERE expires_at <= ?", (now,)).fetchall()
+    else:
+        rows = conn.execute("SELECT session_id, isbn, qty FROM holds WHERE isbn = ? AND expires_at <= ?",
+                            (isbn, now)).fetchall()
+    for sid, i, q in rows:
+        conn.execute("UPDATE stock SET reserved = reserved - ? WHERE isbn = ?", (q, i))
+        conn.execute("DELETE FROM holds WHERE session_id = ? AND isbn = ?", (sid, i))
+    return len(rows)
+
+def available_for(conn: sqlite3.Connection, session_id: Optional[str], isbn: str) -> int:
+    """Units a session can still take: free stock plus whatever it already holds."""
+    row = conn.execute("SELECT qty - reserved FROM stock WHERE isbn = ?", (isbn,)).fetchone()
+    if row is None:
+        return 0
+    held = conn.execute("SELECT qty FROM holds WHERE session_id = ? AND isbn = ?", (session_id, isbn)).fetchone()
+    return row[0] + (held[0] if held else 0)
+
+def consume_stock(conn: sqlite3.Connection, session_id: Optional[str], isbn: str, qty: int,
+                  default_stock: int = 0) -> bool:
+    """Convert a session's hold (if any) into a sale of qty units. Must run inside a write transaction.
+
+    Free stock covers whatever the hold does not, so unheld checkouts still work as
+    long as the units are not reserved by other sessions.
+    """
+    conn.execute("INSERT OR IGNORE INTO stock (isbn, qty) VALUES (?, ?)", (isbn, default_stock))
+    release_expired(conn, time.time(), isbn)
+    row = conn.execute("SELECT qty FROM holds WHERE session_id = ? AND isbn = ?", (session_id, isbn)).fetchone()
+    held = min(row[0], qty) if row else 0
+    cur = conn.execute("UPDATE stock SET qty = qty - ?, reserved = reserved - ? "
+                       "WHERE isbn = ? AND qty - reserved + ? >= ?",
+                       (qty, held, isbn, held, qty))
+    if cur.rowcount != 1:
+        return False
+    if row:
+        conn.execute("DELETE FROM holds WHERE session_id = ? AND isbn = ?", (session_id, isbn))
+        if row[0] > held:
+            conn.execute("UPDATE stock SET reserved = reserved - ? WHERE isbn = ?", (row[0] - held, isbn))
+    return True
+
+# ---------------- Reservation service -----------------
+
+class InventoryService:
+    """Soft holds on stock for carts, shared across threads and worker processes.
+
+    Counters are SQLite rows updated with conditional statements, so processes
+    sharing the database file can never over-reserve. Inside a process, operations
+    on the same book are serialized by a lock stripe, so threads wait on a cheap
+    in-process lock instead of spinning in SQLite's busy handler.
+    """
+
+    def __init__(self, path: str, catalog: Optional[Iterable[Dict[str, Any]]] = None,
+                 hold_ttl: float = 900.0, stripes: int = 16):
+        self.path = path
+        self.hold_ttl = hold_ttl
+        self._stripes = [threading.Lock() for _ in range(stripes)]
+        self._local = threading.local()
+        conn = self._conn()
+        # the ledger tables too: whichever component creates the file creates the whole schema
+        from orders import ensure_schema  # orders imports this module
+        ensure_schema(conn)
+        if catalog is not None:
+            seed_stock(conn, catalog)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # holds are soft state: WAL + NORMAL keeps them consistent without an fsync per cart change
+            conn = self._local.conn = connect(self.path, synchronous="NORMAL")
+        return conn
+
+    def _stripe(self, isbn: str) -> threading.Lock:
+        return self._stripes[zlib.crc32(isbn.encode("utf-8")) % len(self._stripes)]
+
+    def hold(self, session_id: str, item: Dict[str, Any], qty: int) -> bool:
+        """Reserve qty more units of item for session_id; False if not enough free stock."""
+        isbn = item["isbn"]
+        now = time.time()
+        conn = self._conn()
+        with self._stripe(isbn):
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute("INSERT OR IGNORE INTO stock (isbn, qty) VALUES (?, ?)",
+                             (isbn, int(item.get("stock", 0))))
+                release_expired(conn, now, isbn)
+                cur = conn.execute("UPDATE stock SET reserved = reserved + ? WHERE isbn = ? AND qty - reserved >= ?",
+                                   (qty, isbn, qty))
+                ok = cur.rowcount == 1
+                if ok:
+                    conn.execute("INSERT INTO holds (session_id, isbn, qty, expires_at) VALUES (?, ?, ?, ?) "
+                                 "ON CONFLICT (session_id, isbn) DO UPDATE SET qty = qty + excluded.qty, "
+                                 "expires_at = excluded.expires_at",
+                                 (session_id, isbn, qty, now + self.hold_ttl))
+                conn.execute("COMMIT")
+            except sqlite3.Error:
+                conn.execute("ROLLBACK")
+                raise
+        return ok
+
+    def release(self, session_id: str, isbn: Optional[str] = None) -> int:
+        """Drop a session's hold on one book (or all of its holds); returns units released."""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if isbn is None:
+                rows = conn.execute("SELECT isbn, qty FROM holds WHERE session_id = ?", (session_id,)).fetchall()
+            else:
+                rows = conn.execute("SELECT isbn, qty FROM holds WHERE session_id = ? AND isbn = ?",
+                                    (session_id, isbn)).fetchall()
+            for i, q in rows:
+                conn.execute("UPDATE stock SET reserved = reserved - ? WHERE isbn = ?", (q, i))
+            conn.execute("DELETE FROM holds WHERE session_id = ?" + ("" if isbn is None else " AND isbn = ?"),
+                         (session_id,) if isbn is None else (session_id, isbn))
+            conn.execute("COMMIT")
+        except sqlite3.Error:
+            conn.execute("ROLLBACK")
+            raise
+        return sum(q for _, q in rows)
+
+    def extend(self, session_id: str):
+        """Refresh the expiry of all holds of an active session."""
+        self._conn().execute("UPDATE holds SET expires_at = ? WHERE session_id = ?",
+                             (time.time() + self.hold_ttl, session_id))
+
+    def available(self, isbn: str, session_id: Optional[str] = None) -> int:
+        return available_for(self._conn(), session_id, isbn)
+
+    def sweep(self) -> int:
+        """Release every expired hold; safe to call periodically from any worker."""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            n = release_expired(conn, time.time())
+            conn.execute("COMMIT")
+        except sqlite3.Error:
+            conn.execute("ROLLBACK")
+            raise
+        return n
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
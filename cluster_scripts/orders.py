@@ -0,0 +1,239 @@
+import os, queue, secrets, sqlite3, threading, time
+from typing import Dict, Any, List, Optional
+from utils import CSV_DEFAULT_STOCK
+from inventory import STOCK_SCHEMA, connect, seed_stock, consume_stock, available_for
+
+# ---------------- Order IDs -----------------
+
+LEDGER_PATH = "database/orders.db"
+_CROCKFORD = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+
+def _encode_base32(value: int, length: int) -> str:
+    chars = []
+    for _ in range(length):
+        chars.append(_CROCKFORD[value & 31])
+        value >>= 5
+    return "".join(reversed(chars))
+
+class OrderIdGenerator:
+    """ULID-style IDs: 48-bit millisecond timestamp + 80 random bits, monotonic within a process.
+
+    IDs sort by creation time; within the same millisecond the random part is
+    incremented instead of redrawn, so IDs never repeat or go backwards.
+    """
+
+    def __init__(self, prefix: str = "ORD-"):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._last_ms = 0
+        self._last_rand = 0
+
+    def __call__(self) -> str:
+        with self._lock:
+            ms = int(time.time() * 1000)
+            if ms <= self._last_ms:
+                ms = self._last_ms
+                rand = self._last_rand + 1
+                if rand >> 80:
+                    ms, rand = ms + 1, secrets.randbits(80)
+            else:
+                rand = secrets.randbits(80)
+            self._last_ms, self._last_rand = ms, rand
+        return self.prefix + _encode_base32((ms << 80) | rand, 26)
+
+new_order_id = OrderIdGenerator()
+
+# ---------------- Ledger -----------------
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS orders (
+    order_id TEXT PRIMARY KEY,
+    session_id TEXT,
+    created_at REAL,
+    delivery_method TEXT,
+    destination TEXT,
+    payment TEXT,
+    total REAL
+);
+CREATE TABLE IF NOT EXISTS order_lines (
+    order_id TEXT,
+    isbn TEXT,
+    title TEXT,
+    qty INTEGER,
+    unit_price REAL
+);
+"""
+
+def ensure_schema(conn: sqlite3.Connection):
+    """Create the ledger and stock tables; every component that opens the database calls this."""
+    conn.executescript(SCHEMA + STOCK_SCHEMA)
+
+class _Pending:
+    __slots__ = ("order", "result", "done")
+
+    def __init__(self, order: Dict[str, Any]):
+        self.order = order
+        self.result: Dict[str, Any] = {}
+        self.done = threading.Event()
+
+class OrderLedger:
+    """Append-only order ledger in SQLite (WAL) with group commit.
+
+    Sessions enqueue orders; a single writer thread drains the queue and commits
+    up to batch_size orders per transaction. Each order converts the session's
+    holds into stock decrements (see inventory.consume_stock) inside its own
+    savepoint, so an order is either fully applied or rejected, and stock never
+    goes negative across processes.
+    """
+
+    def __init__(self, path: str = LEDGER_PATH, catalog: Optional[List[Dict[str, Any]]] = None,
+                 batch_size: int = 64, max_delay: float = 0.002, commit_timeout: float = 30.0):
+        self.path = path
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.commit_timeout = commit_timeout
+        self._index = {b["isbn"]: b for b in (catalog or [])}
+        self._index_lock = threading.Lock()
+        conn = connect(path)
+        ensure_schema(conn)
+        seed_stock(conn, self._index.values())
+        self._sync_index(conn)
+        conn.close()
+        self._queue: "queue.Queue[Optional[_Pending]]" = queue.Queue()
+        self._writer = threading.Thread(target=self._run, name="order-ledger", daemon=True)
+        self._writer.start()
+
+    def place_order(self, session_id: str, cart: Dict[str, int], items: Dict[str, Dict[str, Any]],
+                    delivery_method: Optional[str] = None, destination: Optional[str] = None,
+                    payment: Optional[str] = None, wait: bool = True) -> Dict[str, Any]:
+        """Queue an order for the next group commit; with wait=True, block until it is durable.
+
+        Returns {"order_id", "status": "confirmed"|"rejected"|"error", ...}; an order the
+        writer has not committed within commit_timeout seconds is reported as an error.
+        An empty cart is rejected (reason "empty") without reaching the ledger.
+        """
+        if not any(qty > 0 for qty in cart.values()):
+            return {"order_id": None, "status": "rejected", "reason": "empty"}
+        lines = []
+        for isbn, qty in cart.items():
+            b = items.get(isbn) or self._index.get(isbn) or {}
+            lines.append({"isbn": isbn, "title": b.get("title", ""), "qty": qty,
+                          "unit_price": float(b.get("price", 0)), "stock": int(b.get("stock", CSV_DEFAULT_STOCK))})
+        order = {
+            "order_id": new_order_id(),
+            "session_id": session_id,
+            "created_at": time.time(),
+            "delivery_method": delivery_method,
+            "destination": destination,
+            "payment": payment,
+            "total": sum(l["qty"] * l["unit_price"] for l in lines),
+            "lines": lines,
+        }
+        pending = _Pending(order)
+        self._queue.put(pending)
+        if not wait:
+            return {"order_id": order["order_id"], "status": "queued"}
+        if not pending.done.wait(self.commit_timeout):
+            return {"order_id": order["order_id"], "status": "error", "reason": "timeout"}
+        return pending.result
+
+    def stock_of(self, isbn: str) -> Optional[int]:
+        with self._index_lock:
+            b = self._index.get(isbn)
+            return None if b is None else int(b.get("stock", 0))
+
+    def close(self):
+        self._queue.put(None)
+        self._writer.join()
+
+    # -- writer thread --
+
+    def _next_batch(self) -> List[Optional[_Pending]]:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_delay
+        while batch[-1] is not None and len(batch) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        # group commit: one fsync per committed batch, not per order
+        conn = connect(self.path)
+        stopping = False
+        while not stopping:
+            batch = self._next_batch()
+            if batch[-1] is None:
+                stopping = True
+                batch.pop()
+            if not batch:
+                continue
+            touched: Dict[str, int] = {}
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                for p in batch:
+                    p.result = self._apply(conn, p.order, touched)
+                conn.execute("COMMIT")
+            except Exception as e:
+                # whatever failed, the batch is rolled back as a whole and every waiter is
+                # answered, so the writer thread keeps serving the next batches
+                try:
+                    if conn.in_transaction:
+                        conn.execute("ROLLBACK")
+                except sqlite3.Error:
+                    pass
+                touched = {}
+                for p in batch:
+                    p.result = {"order_id": p.order["order_id"], "status": "error", "reason": str(e)}
+            with self._index_lock:
+                for isbn, qty in touched.items():
+                    if isbn in self._index:
+                        self._index[isbn]["stock"] = qty
+            for p in batch:
+                p.done.set()
+        conn.close()
+
+    def _apply(self, conn: sqlite3.Connection, order: Dict[str, Any], touched: Dict[str, int]) -> Dict[str, Any]:
+        conn.execute("SAVEPOINT order_sp")
+        for line in order["lines"]:
+            if not consume_stock(conn, order["session_id"], line["isbn"], line["qty"], line["stock"]):
+                conn.execute("ROLLBACK TO order_sp")
+                conn.execute("RELEASE order_sp")
+                return {"order_id": order["order_id"], "status": "rejected", "reason": "out_of_stock",
+                        "isbn": line["isbn"], "title": line["title"],
+                        "available": available_for(conn, order["session_id"], line["isbn"])}
+        conn.execute("INSERT INTO orders VALUES (?, ?, ?, ?, ?, ?, ?)",
+                     (order["order_id"], order["session_id"], order["created_at"], order["delivery_method"],
+                      order["destination"], order["payment"], order["total"]))
+        conn.executemany("INSERT INTO order_lines VALUES (?, ?, ?, ?, ?)",
+                         [(order["order_id"], l["isbn"], l["title"], l["qty"], l["unit_price"]) for l in order["lines"]])
+        for line in order["lines"]:
+            touched[line["isbn"]] = conn.execute("SELECT qty FROM stock WHERE isbn = ?", (line["isbn"],)).fetchone()[0]
+        conn.execute("RELEASE order_sp")
+        return {"order_id": order["order_id"], "status": "confirmed", "total": order["total"]}
+
+    def _sync_index(self, conn: sqlite3.Connection):
+        with self._index_lock:
+            for isbn, qty in conn.execute("SELECT isbn, qty FROM stock"):
+                if isbn in self._index:
+                    self._index[isbn]["stock"] = qty
+
+def iter_order_lines(path: str = LEDGER_PATH):
+    """Yield (session_id, order_id, isbn, qty) rows from the ledger in commit order.
+
+    Yields nothing if the database or its ledger tables do not exist yet.
+    """
+    if not os.path.exists(path):
+        return
+    conn = sqlite3.connect(path)
+    try:
+        tables = {name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        if not {"orders", "order_lines"} <= tables:
+            return
+        yield from conn.execute(
+            "SELECT o.session_id, o.order_id, l.isbn, l.qty FROM order_lines l "
+            "JOIN orders o ON o.order_id = l.order_id ORDER BY o.rowid")
+    finally:
+        conn.close()
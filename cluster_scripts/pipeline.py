@@ -1,10 +1,29 @@
-import json, re
-from typing import Dict, Any, List
-from utils import rule_nlu, load_catalog, filter_books, rank_books, load_books_csv, filter_books_csv, csv_rows_to_items, \
-                  nlg_request_info, nlg_cart_summary, dm_next_action
+import os, re, time
+from functools import cached_property
+from typing import Dict, Any, List, Optional, Callable, Iterator, Tuple, TYPE_CHECKING
+from utils import load_catalog, load_books_csv, load_cached, csv_rows_to_items, choose_filters, iter_results_pages, \
+                  format_result_line, nlg_request_info, nlg_cart_summary, dm_next_action
+from vector_index import iter_search_pages
+from intent_model import load_intent_model, hybrid_nlu
+# Catalogs, indexes and the ledger/inventory/logging subsystems are imported and built
+# lazily through Resources, so the greeting does not wait for them.
+if TYPE_CHECKING:
+    from orders import OrderLedger
 
+CATALOG_PATH = "catalog.json"
+BOOKS_CSV_PATH = "database/books_catalog.csv"
 
-def add_to_cart_from_last(results: List[Dict[str,Any]], user_text: str, cart: Dict[str,int]):
+# Per-channel paging: how many results make up a page and how many pages are flushed per turn
+CHANNELS = {
+    "cli": {"page_size": 5, "pages_per_turn": 1},
+    "web": {"page_size": 10, "pages_per_turn": 2},
+    "voice": {"page_size": 3, "pages_per_turn": 1},
+}
+
+
+def add_to_cart_from_last(lookup: Callable[[int], Optional[Dict[str,Any]]], user_text: str,
+                          cart: Dict[str,int], cart_items: Dict[str,Dict[str,Any]],
+                          reserve: Optional[Callable[[Dict[str,Any], int], bool]] = None):
     # Default quantity is 1; interpret number after 'add' as index by default
     qty = 1
     text_l = user_text.lower()
@@ -12,28 +31,346 @@ def add_to_cart_from_last(results: List[Dict[str,Any]], user_text: str, cart: Di
     m_qty = re.search(r"x\s*(\d+)|\b(\d+)\s*(?:copies|qty)\b", text_l)
     if m_qty:
         qty = int(m_qty.group(1) or m_qty.group(2))
-    # Index selection: 'add 2' means the 2nd item
+    # Index selection: 'add 2' means the 2nd item (numbering is continuous across pages)
     m_idx = re.search(r"\badd\s+(\d+)\b", text_l)
+    item = None
     if m_idx:
         idx = int(m_idx.group(1)) - 1
-        if 0 <= idx < len(results):
-            isbn = results[idx]["isbn"]
-            cart[isbn] = cart.get(isbn, 0) + qty
-            return f"Added “{results[idx]['title']}” (x{qty}) to your cart."
-    if results:
-        isbn = results[0]["isbn"]
+        if idx >= 0:
+            item = lookup(idx)
+        if item is None:
+            # an explicit number must point at a result the user has seen
+            return "I couldn’t find a referenced item to add."
+    if item is None:
+        item = lookup(0)
+    if item is not None:
+        if reserve is not None and not reserve(item, qty):
+            return f"Sorry, “{item['title']}” doesn’t have {qty} more cop{'y' if qty == 1 else 'ies'} available right now."
+        isbn = item["isbn"]
         cart[isbn] = cart.get(isbn, 0) + qty
-        return f"Added “{results[0]['title']}” (x{qty}) to your cart."
+        cart_items[isbn] = item
+        return f"Added “{item['title']}” (x{qty}) to your cart."
     return "I couldn’t find a referenced item to add."
 
 
+def stream_results(pages: Iterator[Tuple[int, List[Dict[str,Any]]]], cursor: Dict[str,Any],
+                   pages_per_turn: int) -> List[Dict[str,Any]]:
+    # Print pages as they are retrieved and advance the cursor; returns the items shown
+    shown: List[Dict[str,Any]] = []
+    for _ in range(pages_per_turn):
+        nxt = next(pages, None)
+        if nxt is None:
+            break
+        offset, page = nxt
+        for i, b in enumerate(page, start=offset + 1):
+            print("Assistant:", format_result_line(i, b), flush=True)
+        cursor["offset"] = offset + len(page)
+        shown.extend(page)
+    return shown
+
+
+class Resources:
+    """Everything a session may need, each created on first use and closed only if it was."""
+
+    @cached_property
+    def catalogs(self) -> Tuple[List[Dict[str,Any]], List[Dict[str,Any]]]:
+        return load_cached("catalogs", [CATALOG_PATH, BOOKS_CSV_PATH],
+                           lambda: (load_catalog(CATALOG_PATH), load_books_csv(BOOKS_CSV_PATH)))
+
+    @property
+    def catalog(self) -> List[Dict[str,Any]]:
+        return self.catalogs[0]
+
+    @property
+    def csv_rows(self) -> List[Dict[str,Any]]:
+        return self.catalogs[1]
+
+    @cached_property
+    def semantic_index(self):
+        # free-text fallback when the rules find no slots at all
+        import vector_index
+        return load_cached("semantic_index", [CATALOG_PATH, BOOKS_CSV_PATH],
+                           lambda: vector_index.VectorIndex.from_catalogs(self.catalog, self.csv_rows),
+                           code=[vector_index.__file__])
+
+    @cached_property
+    def score_table(self):
+        # built offline by `python ranking.py`; without it results keep the (-rating, price) order
+        from ranking import load_score_table
+        return load_score_table()
+
+    @cached_property
+    def also_bought(self):
+        # built offline by `python cooccur.py` from the order ledger
+        from cooccur import load_also_bought
+        return load_also_bought()
+
+    @cached_property
+    def items_by_isbn(self) -> Dict[str,Dict[str,Any]]:
+        return {b["isbn"]: b for b in self.catalog + csv_rows_to_items(self.csv_rows)}
+
+    @cached_property
+    def intent_model(self):
+        # trained offline by `python intent_model.py`; without it the rules decide the intent alone
+        return load_intent_model()
+
+    @cached_property
+    def ledger(self) -> "OrderLedger":
+        from orders import OrderLedger, LEDGER_PATH
+        return OrderLedger(LEDGER_PATH, self.catalog)
+
+    @cached_property
+    def inventory(self):
+        from orders import LEDGER_PATH
+        from inventory import InventoryService
+        return InventoryService(LEDGER_PATH)
+
+    @cached_property
+    def turn_log(self):
+        from turn_log import TurnLogWriter, TURN_LOG_PATH
+        return TurnLogWriter(TURN_LOG_PATH)
+
+    def close(self, session_id: str):
+        if "inventory" in self.__dict__:
+            # holds of an abandoned cart go back to the pool right away instead of waiting for expiry
+            self.inventory.release(session_id)
+            self.inventory.close()
+        if "ledger" in self.__dict__:
+            self.ledger.close()
+        if "turn_log" in self.__dict__:
+            self.turn_log.close()
+        if self.__dict__.get("also_bought"):
+            self.also_bought.close()
+
+
+def result_pages(res: Resources, cursor: Dict[str,Any], offset: int, page_size: int):
+    if "query" in cursor:
+        return iter_search_pages(res.semantic_index, cursor["query"], page_size, offset)
+    key = (res.score_table.rank_key(cursor["filters"].get("price_max"), cursor.get("publishers", ()))
+           if res.score_table else None)
+    return iter_results_pages(res.catalog, res.csv_rows, cursor["filters"], page_size, offset, key)
+
+
+def lookup_result(res: Resources, cursor: Optional[Dict[str,Any]], idx: int) -> Optional[Dict[str,Any]]:
+    if cursor is None:
+        return None
+    hit = next(result_pages(res, cursor, idx, 1), None)
+    return hit[1][0] if hit else None
+
+
+def shown_result(res: Resources, cursor: Optional[Dict[str,Any]], idx: int) -> Optional[Dict[str,Any]]:
+    # only results already printed can be referenced: 'add 8' after page 1 is not a valid pick
+    if cursor is None or idx >= cursor["offset"]:
+        return None
+    return lookup_result(res, cursor, idx)
+
+
+def has_more_results(res: Resources, cursor: Dict[str,Any]) -> bool:
+    # a one-row probe past the cursor, so 'more' is only offered when it will return something
+    return lookup_result(res, cursor, cursor["offset"]) is not None
+
+
+def confirm_order(ledger: "OrderLedger", state: Dict[str,Any]) -> str:
+    if not state["cart"]:
+        # e.g. "Pay with Visa" again right after a confirmed order
+        return "Your cart is empty. Would you like recommendations first?"
+    destination = state.get("address") if state.get("delivery_method") == "courier" else state.get("pickup_location")
+    result = ledger.place_order(state["session_id"], state["cart"], state["cart_items"],
+                                delivery_method=state.get("delivery_method"),
+                                destination=destination,
+                                payment=state.get("payment"))
+    if result["status"] == "rejected":
+        return (f"Sorry, “{result['title']}” has only {result['available']} left in stock. "
+                "Please update your cart and try again.")
+    if result["status"] != "confirmed":
+        return "Sorry, we couldn't record your order. Please try again."
+    state["expecting_delivery"] = False
+    state["order_confirmed"] = True
+    state["cart"] = {}
+    state["cart_items"] = {}
+    return "Payment noted. Your order is confirmed. Order ID: " + result["order_id"]
+
+
+def handle_turn(user: str, nlu: Dict[str,Any], action: Dict[str,Any], state: Dict[str,Any],
+                res: Resources, channel: Dict[str,int], turn: Dict[str,Any]):
+    # Carry out the DM action: print the reply and update the session state; turn collects what was shown
+    if action["type"] == "request_info":
+        if nlu["intent"] == "unknown" and not nlu["slots"] and len(user.split()) >= 3:
+            # free-text need ("something for conversation practice before my trip to Madrid"):
+            # try semantic retrieval before falling back to slot prompts
+            cursor = {"query": user, "offset": 0, "page_size": channel["page_size"]}
+            pages = result_pages(res, cursor, 0, cursor["page_size"])
+            first = next(pages, None)
+            if first is not None:
+                state["results_cursor"] = cursor
+                print("Assistant: These might fit what you describe:", flush=True)
+                turn["result_ids"] = [b["isbn"] for b in stream_results(iter([first]), cursor, 1)]
+                print("Assistant:", "Say 'Add 1' to add the first item to cart, or tell me the language and CEFR level to narrow it down.")
+                return
+        print("Assistant:", nlg_request_info(action["slot"]))
+        return
+
+    if action["type"] == "recommend_books":
+        # exact → drop genre → adjacent level(s); the session keeps only a cursor into the results
+        cursor = {"filters": choose_filters(res.catalog, state.get("slots", {})),
+                  "offset": 0,
+                  "page_size": channel["page_size"],
+                  # session history for ranking, fixed per cursor so pages stay consistent
+                  "publishers": sorted({b["publisher"] for b in state["cart_items"].values() if b.get("publisher")})}
+        state["results_cursor"] = cursor
+        print("Assistant: Here are the best matching options:", flush=True)
+        shown = stream_results(result_pages(res, cursor, 0, cursor["page_size"]), cursor, channel["pages_per_turn"])
+        turn["result_ids"] = [b["isbn"] for b in shown]
+        if not shown:
+            print("Assistant: I couldn't find matching books. Try relaxing filters (level/format/price).")
+            return
+        if has_more_results(res, cursor):
+            print("Assistant:", "Say 'Add 1' to add the first item to cart, or 'more' for further options.")
+        else:
+            print("Assistant:", "Say 'Add 1' to add the first item to cart.")
+        return
+    if action.get("type") == "show_more_results":
+        cursor = state["results_cursor"]
+        if cursor is None:
+            print("Assistant: There are no previous results. Tell me what language/level/genre you need.")
+            return
+        shown = stream_results(result_pages(res, cursor, cursor["offset"], cursor["page_size"]), cursor, channel["pages_per_turn"])
+        turn["result_ids"] = [b["isbn"] for b in shown]
+        if not shown:
+            print("Assistant: No more results. Try changing filters (e.g., price or format).")
+            return
+        if has_more_results(res, cursor):
+            print("Assistant:", "Say 'Add N' to add item N to cart, or 'more' for further options.")
+        else:
+            print("Assistant:", "Say 'Add N' to add item N to cart. That's all the matching books.")
+        return
+
+    if action["type"] == "add_to_cart":
+        before = dict(state["cart"])
+        msg = add_to_cart_from_last(lambda idx: shown_result(res, state["results_cursor"], idx),
+                                    user, state["cart"], state["cart_items"],
+                                    reserve=lambda item, qty: res.inventory.hold(state["session_id"], item, qty))
+        added = [isbn for isbn, qty in state["cart"].items() if qty != before.get(isbn, 0)]
+        from ranking import append_cart_event
+        for isbn in added:
+            append_cart_event(state["session_id"], isbn, state["cart"][isbn] - before.get(isbn, 0))
+        print("Assistant:", msg)
+        if res.also_bought and added:
+            from cooccur import nlg_also_bought
+            suggestions = res.also_bought.neighbours(added[0], exclude=state["cart"], k=3)
+            line = nlg_also_bought([isbn for isbn, _ in suggestions], res.items_by_isbn)
+            if line:
+                print("Assistant:", line)
+        # Resolve prices from the catalog plus the items already placed in the cart (CSV-derived ones included)
+        combined_catalog = res.catalog + list(state["cart_items"].values())
+        print("Assistant:", nlg_cart_summary(state["cart"], combined_catalog))
+        return
+
+    if action["type"] == "remove_from_cart":
+        if state["cart"]:
+            isbn, qty = next(iter(state["cart"].items()))
+            state["cart"].pop(isbn, None)
+            state["cart_items"].pop(isbn, None)
+            res.inventory.release(state["session_id"], isbn)
+            from ranking import append_cart_event
+            append_cart_event(state["session_id"], isbn, -qty)
+            print("Assistant: Removed one item from your cart.")
+        else:
+            print("Assistant: Your cart is already empty.")
+        return
+
+    if action["type"] == "provide_cart_summary":
+        combined_catalog = res.catalog + list(state["cart_items"].values())
+        print("Assistant:", nlg_cart_summary(state["cart"], combined_catalog))
+        return
+
+    if action["type"] == "proceed_to_checkout":
+        if not state["cart"]:
+            print("Assistant: Your cart is empty. Would you like recommendations first?")
+            return
+        if state.get("delivery_method") is None:
+            print("Assistant: Delivery by pickup or courier?")
+            state["expecting_delivery"] = True
+        elif state["delivery_method"] == "courier" and state.get("address") is None:
+            print("Assistant: Please provide the delivery address.")
+        elif state.get("payment") is None:
+            print("Assistant: Please provide your payment method (e.g., Visa/Mastercard).")
+        else:
+            print("Assistant:", confirm_order(res.ledger, state))
+        return
+
+    if action["type"] == "ask_delivery_details":
+        ul = user.lower()
+        if "pickup" in ul:
+            state["delivery_method"] = "pickup"
+            state["expecting_delivery"] = True
+            print("Assistant: Noted pickup. Choose a pickup location (e.g., DISI Helpdesk, Povo).")
+        elif any(k in ul for k in ["courier","delivery","ship"]):
+            state["delivery_method"] = "courier"
+            state["expecting_delivery"] = True
+            print("Assistant: Please provide the delivery address.")
+        else:
+            state["expecting_delivery"] = True
+            print("Assistant: Delivery by pickup or courier?")
+        return
+
+    if action["type"] == "ack_address":
+        state["address"] = user
+        print("Assistant: Address received. Please provide your payment method (e.g., Visa/Mastercard).")
+        return
+
+    if action.get("type") == "ask_pickup_location":
+        print("Assistant: Please choose a pickup location (e.g., DISI Helpdesk, Povo).")
+        return
+
+    if action.get("type") == "ack_pickup_location":
+        state["pickup_location"] = user
+        print("Assistant: Pickup location noted. Please provide your payment method (e.g., Visa/Mastercard).")
+        return
+
+    if action["type"] == "ack_payment":
+        state["payment"] = user
+        print("Assistant:", confirm_order(res.ledger, state))
+        return
+
+    if action.get("type") == "ask_payment":
+        print("Assistant: Please provide your payment method (e.g., Visa/Mastercard).")
+        return
+
+    if action["type"] == "confirmation":
+        print("Assistant: Your request has been recorded.")
+        return
+
+    if action["type"] == "help":
+        print("Assistant: You can ask for books by language and level (e.g., 'Italian A2 reader under €20'), view cart, add to cart, or checkout.")
+        return
+
+    if action.get("type") == "payment_help":
+        print("Assistant: You can pay during checkout using Visa or Mastercard. Say 'checkout' or 'pay' to start; after delivery choice and (if courier) address, provide the card brand like 'Visa'.")
+        return
+
+    if action.get("type") == "polite_ack":
+        if state.get("order_confirmed"):
+            print("Assistant: You're welcome! Order confirmed. If you'd like to exit, type 'quit' or 'bye'.")
+        else:
+            print("Assistant: You're welcome! If you'd like to exit, type 'quit' or 'bye'.")
+        return
+
+    if action.get("type") == "farewell":
+        print("Assistant: Bye! Have a great day!")
+        return
+
+    print("Assistant: Sorry, I didn’t catch that. You can ask for recommendations, filter by format/price, manage cart, or checkout.")
+
+
 def main():
-    catalog = load_catalog("catalog.json")
-    csv_rows = load_books_csv("database/books_catalog.csv")
+    channel = CHANNELS.get(os.environ.get("BOOKBOT_CHANNEL", "cli"), CHANNELS["cli"])
+    res = Resources()
     state = {
+        "session_id": os.urandom(16).hex(),
         "cart": {},
-        "last_recommendations": [],
-        "results_offset": 0,
+        "cart_items": {},
+        "results_cursor": None,
         "delivery_method": None,
         "pickup_location": None,
         "address": None,
@@ -43,6 +380,7 @@ def main():
         "last_nlu": {},
         "slots": {}
     }
+
     print("Assistant: Hi! I can recommend language-learning books by language and CEFR level. What are you studying?")
     while True:
         try:
@@ -53,203 +391,42 @@ def main():
             print("Assistant: Bye! Have a great day!")
             break
 
-        nlu = rule_nlu(user)
+        if state["cart"]:
+            # keep the cart's holds alive while the session is active
+            res.inventory.extend(state["session_id"])
+
+        turn = {"result_ids": []}
+        cart_before = dict(state["cart"])
+        t0 = time.perf_counter()
+        nlu = hybrid_nlu(user, res.intent_model)
         state["last_nlu"] = nlu
         # Merge newly extracted slots into persistent state
         for k, v in nlu.get("slots", {}).items():
             if v is not None:
                 state.setdefault("slots", {})[k] = v
+        t1 = time.perf_counter()
         action = dm_next_action(state)
+        t2 = time.perf_counter()
+        handle_turn(user, nlu, action, state, res, channel, turn)
 
-        if action["type"] == "request_info":
-            print("Assistant:", nlg_request_info(action["slot"]))
-            continue
-
-        if action["type"] == "recommend_books":
-            s = state.get("slots", {})
-            lang = s.get("language")
-            level = s.get("level")
-            genre = s.get("genre")
-            fmt = s.get("format")
-            pmin = s.get("price_min")
-            pmax = s.get("price_max")
-
-            # Build attempts: exact → drop genre → adjacent level(s)
-            attempts = []
-            attempts.append((lang, level, genre, fmt))
-            attempts.append((lang, level, None, fmt))
-            # Adjacent level heuristic
-            level_order = ["A1","A2","B1","B2","C1","C2"]
-            if level in level_order:
-                idx = level_order.index(level)
-                neighbors = []
-                if idx - 1 >= 0:
-                    neighbors.append(level_order[idx-1])
-                if idx + 1 < len(level_order):
-                    neighbors.append(level_order[idx+1])
-                for nb in neighbors:
-                    attempts.append((lang, nb, genre, fmt))
-                    attempts.append((lang, nb, None, fmt))
-
-            chosen_filters = (lang, level, genre, fmt)
-            candidates = []
-            for L, Lv, G, F in attempts:
-                candidates = filter_books(
-                    catalog,
-                    language=L,
-                    level=Lv,
-                    genre=G,
-                    fmt=F,
-                    price_min=pmin,
-                    price_max=pmax
-                )
-                if candidates:
-                    chosen_filters = (L, Lv, G, F)
-                    break
-
-            ranked = rank_books(candidates)
-            # Also list all relevant titles from the CSV with the same filters
-            csv_list = filter_books_csv(
-                csv_rows,
-                language=chosen_filters[0],
-                level=chosen_filters[1],
-                genre=(None if chosen_filters[2] is None else chosen_filters[2]),
-                fmt=chosen_filters[3],
-                price_min=pmin,
-                price_max=pmax
-            )
-            csv_items = csv_rows_to_items(csv_list)
-            combined = ranked + csv_items
-            state["last_recommendations"] = combined
-            state["results_offset"] = 0
-            # Print unified list with continuous numbering
-            print("Assistant: Here are all matching options:")
-            for i, b in enumerate(combined, start=1):
-                fmts = ", ".join(b.get("format", [])) if isinstance(b.get("format"), list) else str(b.get("format"))
-                lang = b.get("language", "").strip()
-                cefr = b.get("cefr", "").strip()
-                genre = b.get("genre", "").strip()
-                price = float(b.get("price", 0))
-                rating = float(b.get("rating", 0))
-                print("Assistant:", f"{i}. {b['title']} — {lang} {cefr} · {genre} · {fmts} · €{price:.2f} (⭐{rating})")
-            print("Assistant:", "Say 'Add 1' to add the first item to cart.")
-            continue
-        if action.get("type") == "show_more_results":
-            if not state["last_recommendations"]:
-                print("Assistant: There are no previous results. Tell me what language/level/genre you need.")
-                continue
-            state["results_offset"] += 3
-            remaining = state["last_recommendations"][state["results_offset"]:]
-            if not remaining:
-                print("Assistant: No more results. Try changing filters (e.g., price or format).")
-                continue
-            print("Assistant:", nlg_recommendations(remaining))
-            continue
-
-        if action["type"] == "add_to_cart":
-            msg = add_to_cart_from_last(state["last_recommendations"], user, state["cart"])
-            print("Assistant:", msg)
-            # Use combined catalog including CSV-derived items so prices resolve
-            combined_catalog = catalog + state.get("last_recommendations", [])
-            print("Assistant:", nlg_cart_summary(state["cart"], combined_catalog))
-            continue
-
-        if action["type"] == "remove_from_cart":
-            if state["cart"]:
-                isbn, _ = next(iter(state["cart"].items()))
-                state["cart"].pop(isbn, None)
-                print("Assistant: Removed one item from your cart.")
-            else:
-                print("Assistant: Your cart is already empty.")
-            continue
-
-        if action["type"] == "provide_cart_summary":
-            combined_catalog = catalog + state.get("last_recommendations", [])
-            print("Assistant:", nlg_cart_summary(state["cart"], combined_catalog))
-            continue
-
-        if action["type"] == "proceed_to_checkout":
-            if not state["cart"]:
-                print("Assistant: Your cart is empty. Would you like recommendations first?")
-                continue
-            if state.get("delivery_method") is None:
-                print("Assistant: Delivery by pickup or courier?")
-                state["expecting_delivery"] = True
-            elif state["delivery_method"] == "courier" and state.get("address") is None:
-                print("Assistant: Please provide the delivery address.")
-            elif state.get("payment") is None:
-                print("Assistant: Please provide your payment method (e.g., Visa/Mastercard).")
-            else:
-                print("Assistant: Payment noted. Your order is confirmed. Order ID: ORD-" + str(abs(hash(str(state))) % 100000))
-                # reset checkout flags for next session
-                state["expecting_delivery"] = False
-                state["order_confirmed"] = True
-            continue
-
-        if action["type"] == "ask_delivery_details":
-            ul = user.lower()
-            if "pickup" in ul:
-                state["delivery_method"] = "pickup"
-                state["expecting_delivery"] = True
-                print("Assistant: Noted pickup. Choose a pickup location (e.g., DISI Helpdesk, Povo).")
-            elif any(k in ul for k in ["courier","delivery","ship"]):
-                state["delivery_method"] = "courier"
-                state["expecting_delivery"] = True
-                print("Assistant: Please provide the delivery address.")
-            else:
-                state["expecting_delivery"] = True
-                print("Assistant: Delivery by pickup or courier?")
-            continue
-
-        if action["type"] == "ack_address":
-            state["address"] = user
-            print("Assistant: Address received. Please provide your payment method (e.g., Visa/Mastercard).")
-            continue
-
-        if action.get("type") == "ask_pickup_location":
-            print("Assistant: Please choose a pickup location (e.g., DISI Helpdesk, Povo).")
-            continue
-
-        if action.get("type") == "ack_pickup_location":
-            state["pickup_location"] = user
-            print("Assistant: Pickup location noted. Please provide your payment method (e.g., Visa/Mastercard).")
-            continue
-
-        if action["type"] == "ack_payment":
-            state["payment"] = user
-            print("Assistant: Payment noted. Your order is confirmed. Order ID: ORD-" + str(abs(hash(user)) % 100000))
-            state["expecting_delivery"] = False
-            state["order_confirmed"] = True
-            continue
-
-        if action.get("type") == "ask_payment":
-            print("Assistant: Please provide your payment method (e.g., Visa/Mastercard).")
-            continue
-
-        if action["type"] == "confirmation":
-            print("Assistant: Your request has been recorded.")
-            continue
-
-        if action["type"] == "help":
-            print("Assistant: You can ask for books by language and level (e.g., 'Italian A2 reader under €20'), view cart, add to cart, or checkout.")
-            continue
-
-        if action.get("type") == "payment_help":
-            print("Assistant: You can pay during checkout using Visa or Mastercard. Say 'checkout' or 'pay' to start; after delivery choice and (if courier) address, provide the card brand like 'Visa'.")
-            continue
-
-        if action.get("type") == "polite_ack":
-            if state.get("order_confirmed"):
-                print("Assistant: You're welcome! Order confirmed. If you'd like to exit, type 'quit' or 'bye'.")
-            else:
-                print("Assistant: You're welcome! If you'd like to exit, type 'quit' or 'bye'.")
-            continue
-
-        if action.get("type") == "farewell":
-            print("Assistant: Bye! Have a great day!")
-            continue
+        # one event per turn, handed to the background writer; never blocks the reply
+        t3 = time.perf_counter()
+        cart_delta = {isbn: state["cart"].get(isbn, 0) - cart_before.get(isbn, 0)
+                      for isbn in set(state["cart"]) | set(cart_before)
+                      if state["cart"].get(isbn, 0) != cart_before.get(isbn, 0)}
+        res.turn_log.log({
+            "ts": time.time(),
+            "session_id": state["session_id"],
+            "utterance": user,
+            "nlu": nlu,
+            "action": action,
+            "result_ids": turn["result_ids"],
+            "cart_delta": cart_delta,
+            "timings_us": {"nlu": round((t1 - t0) * 1e6), "dm": round((t2 - t1) * 1e6),
+                           "handle": round((t3 - t2) * 1e6)},
+        })
 
-        print("Assistant: Sorry, I didn’t catch that. You can ask for recommendations, filter by format/price, manage cart, or checkout.")
+    res.close(state["session_id"])
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,194 @@
+import json, math, os, struct, time
+from array import array
+from collections import Counter, OrderedDict, defaultdict
+from itertools import groupby
+from typing import Dict, Any, List, Optional, Iterable, Iterator, Callable, Tuple
+from utils import LOG_DIR, load_catalog, load_books_csv, csv_rows_to_items
+from orders import LEDGER_PATH, iter_order_lines
+
+# ---------------- Interaction logs -----------------
+
+CART_LOG_PATH = os.path.join(LOG_DIR, "cart_events.jsonl")
+
+def append_cart_event(session_id: str, isbn: str, qty: int, path: str = CART_LOG_PATH):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps({"ts": time.time(), "session_id": session_id, "isbn": isbn, "qty": qty}) + "\n")
+
+def iter_cart_events(path: str = CART_LOG_PATH) -> Iterator[Dict[str, Any]]:
+    if not os.path.exists(path):
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+# ---------------- Offline: per-segment score tables -----------------
+
+SCORES_PATH = "database/segment_scores.bin"
+_MAGIC = b"BBSC1"
+
+# base = rating + popularity + co-purchase (precomputed); price fit and session affinity
+# are added online. One rating star is worth 0.2, so a book at half the budget outranks
+# one at the cap when it is rated up to half a star lower.
+WEIGHTS = {"rating": 1.0, "popularity": 0.4, "copurchase": 0.2, "price_fit": 0.2, "session": 0.1}
+
+def segment_of(item: Dict[str, Any]) -> str:
+    return "|".join((item.get("language", "").lower(), item.get("cefr", "").upper(), item.get("genre", "").lower()))
+
+def _interaction_signals(baskets: Iterable[Iterable[Tuple[str, int]]], units: Counter, partners: Dict[str, set]):
+    for basket in baskets:
+        net: Counter = Counter()
+        for isbn, qty in basket:
+            net[isbn] += qty
+        # cart removals are logged as negative quantities: only what is left counts
+        isbns = {isbn for isbn, qty in net.items() if qty > 0}
+        for isbn in isbns:
+            units[isbn] += net[isbn]
+        for isbn in isbns:
+            partners[isbn].update(isbns - {isbn})
+
+# a cart with no events for this long counts as finished (carts are held for 15 minutes)
+SESSION_IDLE = 3600.0
+
+def _order_baskets(ledger_path: str) -> Iterator[List[Tuple[str, int]]]:
+    # the ledger returns an order's lines together: one basket per order, one in memory at a time
+    for _, lines in groupby(iter_order_lines(ledger_path), key=lambda row: row[1]):
+        yield [(isbn, qty) for _, _, isbn, qty in lines]
+
+def _cart_baskets(events: Iterable[Dict[str, Any]], idle: float = SESSION_IDLE) -> Iterator[List[Tuple[str, int]]]:
+    """One basket per session, emitted once the session has been idle for `idle` seconds.
+
+    The log is appended in time order, so only carts active within the idle window
+    are held in memory, however long the log is.
+    """
+    open_carts: "OrderedDict[str, Tuple[float, List[Tuple[str, int]]]]" = OrderedDict()
+    for e in events:
+        ts = e.get("ts", 0.0)
+        while open_carts:
+            sid, (last, basket) = next(iter(open_carts.items()))
+            if last > ts - idle:
+                break
+            del open_carts[sid]
+            yield basket
+        basket = open_carts.pop(e["session_id"], (ts, []))[1]
+        basket.append((e["isbn"], e["qty"]))
+        open_carts[e["session_id"]] = (ts, basket)
+    for _, basket in open_carts.values():
+        yield basket
+
+def _normalize(counts: Dict[str, float]) -> Dict[str, float]:
+    top = max(counts.values(), default=0)
+    if top <= 0:
+        return {}
+    return {k: math.log1p(v) / math.log1p(top) for k, v in counts.items()}
+
+def build_score_tables(items: List[Dict[str, Any]], ledger_path: str = LEDGER_PATH,
+                       cart_log_path: str = CART_LOG_PATH, out_path: str = SCORES_PATH,
+                       weights: Dict[str, float] = WEIGHTS) -> int:
+    """Mine order/cart logs and write base scores per (language, CEFR, genre) segment.
+
+    Orders count fully; cart adds count half (interest without purchase).
+    Returns the number of items written.
+    """
+    order_units: Counter = Counter()
+    cart_units: Counter = Counter()
+    partners: Dict[str, set] = defaultdict(set)
+    _interaction_signals(_order_baskets(ledger_path), order_units, partners)
+    _interaction_signals(_cart_baskets(iter_cart_events(cart_log_path)), cart_units, partners)
+    popularity = _normalize({k: order_units[k] + 0.5 * cart_units[k] for k in set(order_units) | set(cart_units)})
+    copurchase = _normalize({k: len(v) for k, v in partners.items()})
+
+    segments: Dict[str, List[Tuple[float, str]]] = defaultdict(list)
+    for b in items:
+        base = (weights["rating"] * float(b.get("rating", 0)) / 5.0
+                + weights["popularity"] * popularity.get(b["isbn"], 0.0)
+                + weights["copurchase"] * copurchase.get(b["isbn"], 0.0))
+        segments[segment_of(b)].append((base, b["isbn"]))
+
+    isbns: List[str] = []
+    scores = array("f")
+    index = []
+    for seg in sorted(segments):
+        rows = sorted(segments[seg], key=lambda r: -r[0])
+        index.append([seg, len(isbns), len(rows)])
+        isbns.extend(i for _, i in rows)
+        scores.extend(s for s, _ in rows)
+    header = json.dumps({"weights": weights, "segments": index, "isbns": isbns}).encode("utf-8")
+    os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+    with open(out_path, "wb") as f:
+        f.write(_MAGIC + struct.pack("<I", len(header)) + header)
+        scores.tofile(f)
+    return len(isbns)
+
+# ---------------- Online: lookup + price fit -----------------
+# Filters can span several segments (relaxed genre or level) and price fit depends on
+# the request, so results are not merged from the stored segment order.
+
+def price_fit(price: float, budget: Optional[float]) -> float:
+    """Share of the stated budget a book leaves unspent: 1 for free, 0 at or above the cap.
+
+    Candidates already passed the price_max filter, so only the preference among
+    in-budget prices matters; without a budget there is no price preference.
+    """
+    if not budget:
+        return 0.0
+    return max(0.0, 1.0 - price / budget)
+
+class ScoreTable:
+    """Precomputed base scores (float32), stored grouped by segment and looked up per item.
+
+    Ranking a request costs one dict lookup plus the price fit for each filtered
+    item; the page itself is cut with the heap selection in utils._ranked_window.
+    """
+
+    def __init__(self, weights: Dict[str, float], segments: Dict[str, Dict[str, int]], scores: array):
+        self.weights = weights
+        self.segments = segments
+        self.scores = scores
+
+    @classmethod
+    def load(cls, path: str = SCORES_PATH) -> "ScoreTable":
+        with open(path, "rb") as f:
+            if f.read(len(_MAGIC)) != _MAGIC:
+                raise ValueError(f"{path} is not a segment score table")
+            (n,) = struct.unpack("<I", f.read(4))
+            header = json.loads(f.read(n).decode("utf-8"))
+            scores = array("f")
+            scores.frombytes(f.read())
+        isbns = header["isbns"]
+        segments = {seg: {isbns[i]: i for i in range(start, start + count)}
+                    for seg, start, count in header["segments"]}
+        return cls(header["weights"], segments, scores)
+
+    def base(self, item: Dict[str, Any]) -> float:
+        pos = self.segments.get(segment_of(item), {}).get(item.get("isbn"))
+        if pos is None:
+            # unseen item (catalog grew since the last build): rating only
+            return self.weights["rating"] * float(item.get("rating", 0)) / 5.0
+        return self.scores[pos]
+
+    def rank_key(self, budget: Optional[float] = None,
+                 publishers: Iterable[str] = ()) -> Callable[[Dict[str, Any]], Tuple[float, float]]:
+        """Sort key for one request: stored base score, price fit to budget and session affinity.
+
+        publishers are those of the books already in the session's cart; their other
+        titles (the next level of a series, its workbook) get a small boost.
+        """
+        w = self.weights["price_fit"]
+        w_session = self.weights.get("session", WEIGHTS["session"])
+        preferred = set(publishers)
+        def key(item: Dict[str, Any]) -> Tuple[float, float]:
+            price = float(item.get("price", 0))
+            affinity = w_session if item.get("publisher") in preferred else 0.0
+            return (-(self.base(item) + w * price_fit(price, budget) + affinity), price)
+        return key
+
+def load_score_table(path: str = SCORES_PATH) -> Optional[ScoreTable]:
+    return ScoreTable.load(path) if os.path.exists(path) else None
+
+if __name__ == "__main__":
+    items = load_catalog("catalog.json") + csv_rows_to_items(load_books_csv("database/books_catalog.csv"))
+    n = build_score_tables(items)
+    print(f"Wrote {n} item scores to {SCORES_PATH}")
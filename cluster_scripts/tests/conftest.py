@@ -0,0 +1,4 @@
+import os, sys
+
+# the scripts are run from cluster_scripts/ and import each other as top-level modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,24 @@
+import utils
+
+class Cached:
+    pass
+
+def test_load_cached_reuses_and_invalidates(tmp_path, monkeypatch):
+    monkeypatch.setattr(utils, "CACHE_DIR", str(tmp_path / "cache"))
+    source = tmp_path / "data.json"
+    source.write_text("[1]")
+    builds = []
+    build = lambda: builds.append(1) or len(builds)
+    assert utils.load_cached("x", [str(source)], build) == 1
+    assert utils.load_cached("x", [str(source)], build) == 1
+    source.write_text("[1, 2]")
+    assert utils.load_cached("x", [str(source)], build) == 2
+
+def test_unloadable_value_is_a_cache_miss(tmp_path, monkeypatch):
+    monkeypatch.setattr(utils, "CACHE_DIR", str(tmp_path / "cache"))
+    source = tmp_path / "data.json"
+    source.write_text("[1]")
+    utils.load_cached("x", [str(source)], Cached)
+    # the cached class goes away (renamed or removed) while the signature still matches
+    monkeypatch.delattr(__import__(__name__), "Cached")
+    assert utils.load_cached("x", [str(source)], lambda: "rebuilt") == "rebuilt"
@@ -0,0 +1,72 @@
+import threading, time
+import pytest
+from inventory import InventoryService
+from orders import OrderLedger
+
+ITEM = {"isbn": "A", "title": "Book A", "price": 10.0, "stock": 5}
+
+@pytest.fixture
+def db(tmp_path):
+    return str(tmp_path / "orders.db")
+
+def _reserved(inventory, isbn):
+    return inventory._conn().execute("SELECT qty, reserved FROM stock WHERE isbn = ?", (isbn,)).fetchone()
+
+def test_concurrent_hold_and_order_never_oversells(db):
+    ledger = OrderLedger(db, [dict(ITEM)])
+    inventory = InventoryService(db)
+    results = []
+    start = threading.Barrier(20)
+
+    def shopper(n):
+        session = f"s{n}"
+        start.wait()
+        if not inventory.hold(session, ITEM, 1):
+            results.append("refused")
+            return
+        results.append(ledger.place_order(session, {"A": 1}, {"A": ITEM})["status"])
+
+    threads = [threading.Thread(target=shopper, args=(n,)) for n in range(20)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    ledger.close()
+    assert results.count("confirmed") == 5
+    assert results.count("refused") == 15
+    assert _reserved(inventory, "A") == (0, 0)
+    inventory.close()
+
+def test_unheld_order_cannot_take_held_units(db):
+    ledger = OrderLedger(db, [dict(ITEM)])
+    inventory = InventoryService(db)
+    assert inventory.hold("s1", ITEM, 4)
+    result = ledger.place_order("s2", {"A": 2}, {"A": ITEM})
+    assert result["status"] == "rejected" and result["available"] == 1
+    assert ledger.place_order("s1", {"A": 4}, {"A": ITEM})["status"] == "confirmed"
+    assert _reserved(inventory, "A") == (1, 0)
+    ledger.close()
+    inventory.close()
+
+def test_expired_hold_is_released(db):
+    inventory = InventoryService(db, hold_ttl=0.05)
+    assert inventory.hold("s1", ITEM, 5)
+    assert not inventory.hold("s2", ITEM, 1)
+    time.sleep(0.1)
+    # the next hold on the book returns the expired units to the pool first
+    assert inventory.hold("s2", ITEM, 2)
+    assert _reserved(inventory, "A") == (5, 2)
+    assert inventory.available("A", "s1") == 3
+    time.sleep(0.1)
+    assert inventory.sweep() == 1
+    assert _reserved(inventory, "A") == (5, 0)
+    inventory.close()
+
+def test_release_returns_units(db):
+    inventory = InventoryService(db)
+    assert inventory.hold("s1", ITEM, 2)
+    assert inventory.hold("s1", {**ITEM, "isbn": "B"}, 1)
+    assert inventory.release("s1", "A") == 2
+    assert inventory.release("s1") == 1
+    assert _reserved(inventory, "A") == (5, 0)
+    inventory.close()
@@ -0,0 +1,97 @@
+import sqlite3
+import pytest
+from orders import OrderLedger, iter_order_lines
+
+CATALOG = [
+    {"isbn": "A", "title": "Book A", "price": 10.0, "stock": 5},
+    {"isbn": "B", "title": "Book B", "price": 20.0, "stock": 1},
+]
+
+@pytest.fixture
+def ledger(tmp_path):
+    ledger = OrderLedger(str(tmp_path / "orders.db"), [dict(b) for b in CATALOG])
+    yield ledger
+    ledger.close()
+
+def _stock(path, isbn):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("SELECT qty, reserved FROM stock WHERE isbn = ?", (isbn,)).fetchone()
+    finally:
+        conn.close()
+
+def test_confirmed_order_decrements_stock(ledger):
+    result = ledger.place_order("s1", {"A": 2}, {})
+    assert result["status"] == "confirmed"
+    assert result["total"] == 20.0
+    assert _stock(ledger.path, "A") == (3, 0)
+    assert ledger.stock_of("A") == 3
+    assert [row[1:] for row in iter_order_lines(ledger.path)] == [(result["order_id"], "A", 2)]
+
+def test_rejected_order_rolls_back_its_savepoint(ledger):
+    # A can be taken, B cannot: the A decrement made earlier in the savepoint must be undone
+    result = ledger.place_order("s1", {"A": 2, "B": 3}, {})
+    assert result["status"] == "rejected"
+    assert (result["isbn"], result["available"]) == ("B", 1)
+    assert _stock(ledger.path, "A") == (5, 0)
+    assert _stock(ledger.path, "B") == (1, 0)
+    assert list(iter_order_lines(ledger.path)) == []
+    # the rest of the batch is unaffected
+    assert ledger.place_order("s2", {"A": 1, "B": 1}, {})["status"] == "confirmed"
+    assert _stock(ledger.path, "A") == (4, 0)
+
+def test_writer_survives_unexpected_errors(ledger):
+    apply = ledger._apply
+    calls = []
+
+    def failing_once(conn, order, touched):
+        calls.append(order["order_id"])
+        if len(calls) == 1:
+            raise RuntimeError("boom")
+        return apply(conn, order, touched)
+
+    ledger._apply = failing_once
+    first = ledger.place_order("s1", {"A": 1}, {})
+    assert first["status"] == "error" and first["reason"] == "boom"
+    assert _stock(ledger.path, "A") == (5, 0)
+    assert ledger.place_order("s1", {"A": 1}, {})["status"] == "confirmed"
+
+def test_wait_times_out(tmp_path):
+    ledger = OrderLedger(str(tmp_path / "orders.db"), [dict(b) for b in CATALOG], commit_timeout=0.05)
+    ledger._queue.put = lambda pending: None  # the writer never sees the order
+    result = ledger.place_order("s1", {"A": 1}, {})
+    assert result["status"] == "error" and result["reason"] == "timeout"
+    del ledger._queue.put
+    ledger.close()
+
+def test_order_lines_of_a_database_without_orders(tmp_path):
+    path = str(tmp_path / "orders.db")
+    assert list(iter_order_lines(path)) == []
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE stock (isbn TEXT PRIMARY KEY, qty INTEGER, reserved INTEGER)")
+    conn.close()
+    assert list(iter_order_lines(path)) == []
+
+def test_inventory_creates_the_ledger_schema(tmp_path):
+    from inventory import InventoryService
+    path = str(tmp_path / "orders.db")
+    inventory = InventoryService(path)
+    assert inventory.hold("s1", CATALOG[0], 1)
+    inventory.close()
+    assert list(iter_order_lines(path)) == []
+    conn = sqlite3.connect(path)
+    try:
+        tables = {name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    finally:
+        conn.close()
+    assert {"orders", "order_lines", "stock", "holds"} <= tables
+
+def test_empty_cart_is_rejected_without_an_order(ledger):
+    result = ledger.place_order("s1", {}, {})
+    assert result["status"] == "rejected" and result["reason"] == "empty"
+    assert ledger.place_order("s1", {"A": 0}, {})["reason"] == "empty"
+    conn = sqlite3.connect(ledger.path)
+    try:
+        assert conn.execute("SELECT COUNT(*) FROM orders").fetchone() == (0,)
+    finally:
+        conn.close()
@@ -0,0 +1,22 @@
+from pipeline import add_to_cart_from_last
+
+SHOWN = [{"isbn": "A", "title": "Book A"}, {"isbn": "B", "title": "Book B"}]
+
+def _lookup(idx):
+    # stands in for pipeline.shown_result after a page of two results
+    return SHOWN[idx] if idx < len(SHOWN) else None
+
+def test_add_by_number():
+    cart, items = {}, {}
+    assert add_to_cart_from_last(_lookup, "add 2", cart, items) == "Added “Book B” (x1) to your cart."
+    assert cart == {"B": 1}
+
+def test_add_number_past_shown_results_is_refused():
+    cart, items = {}, {}
+    assert add_to_cart_from_last(_lookup, "add 8", cart, items) == "I couldn’t find a referenced item to add."
+    assert cart == {}
+
+def test_add_without_number_takes_the_first_result():
+    cart, items = {}, {}
+    add_to_cart_from_last(_lookup, "add it to my cart x2", cart, items)
+    assert cart == {"A": 2}
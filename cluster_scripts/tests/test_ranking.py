@@ -0,0 +1,44 @@
+from ranking import build_score_tables, load_score_table, price_fit
+
+ITEMS = [
+    {"isbn": "PRICEY", "title": "Near the cap", "language": "English", "cefr": "B1", "genre": "Grammar",
+     "price": 19.9, "rating": 4.5},
+    {"isbn": "CHEAP", "title": "Well within budget", "language": "English", "cefr": "B1", "genre": "Grammar",
+     "price": 5.0, "rating": 4.3},
+]
+
+def _table(tmp_path):
+    build_score_tables(ITEMS, str(tmp_path / "orders.db"), str(tmp_path / "cart_events.jsonl"),
+                       str(tmp_path / "scores.bin"))
+    return load_score_table(str(tmp_path / "scores.bin"))
+
+def test_price_fit_prefers_unspent_budget():
+    assert price_fit(5.0, 20.0) > price_fit(19.9, 20.0) > price_fit(25.0, 20.0) == 0.0
+    assert price_fit(5.0, None) == 0.0
+
+def test_budget_changes_the_order(tmp_path):
+    table = _table(tmp_path)
+    assert [b["isbn"] for b in sorted(ITEMS, key=table.rank_key())] == ["PRICEY", "CHEAP"]
+    assert [b["isbn"] for b in sorted(ITEMS, key=table.rank_key(20.0))] == ["CHEAP", "PRICEY"]
+
+def test_cart_baskets_are_emitted_when_a_session_goes_idle():
+    from ranking import _cart_baskets
+    events = [
+        {"ts": 0, "session_id": "s1", "isbn": "A", "qty": 1},
+        {"ts": 10, "session_id": "s2", "isbn": "B", "qty": 1},
+        {"ts": 20, "session_id": "s1", "isbn": "C", "qty": 2},
+        {"ts": 20, "session_id": "s1", "isbn": "A", "qty": -1},
+        {"ts": 5000, "session_id": "s3", "isbn": "D", "qty": 1},
+    ]
+    baskets = _cart_baskets(iter(events), idle=3600)
+    # both earlier sessions are finished before s3's event is consumed
+    assert next(baskets) == [("B", 1)]
+    assert next(baskets) == [("A", 1), ("C", 2), ("A", -1)]
+    assert list(baskets) == [[("D", 1)]]
+
+def test_session_publishers_change_the_order(tmp_path):
+    items = [dict(ITEMS[0], publisher="LangPress"), dict(ITEMS[1], publisher="Oxford University Press")]
+    table = _table(tmp_path)
+    assert [b["isbn"] for b in sorted(items, key=table.rank_key())] == ["PRICEY", "CHEAP"]
+    key = table.rank_key(publishers=["Oxford University Press"])
+    assert [b["isbn"] for b in sorted(items, key=key)] == ["CHEAP", "PRICEY"]
@@ -0,0 +1,25 @@
+import time
+from turn_log import TurnLogWriter, encode_event, decode_event, iter_turn_events
+
+class Unencodable:
+    def __str__(self):
+        raise RuntimeError("cannot encode")
+
+def test_integers_round_trip_in_the_smallest_width():
+    for value, size in [(127, 1), (128, 2), (65535, 3), (2**32, 9), (-33, 2), (-129, 3), (-2**31, 5)]:
+        record = encode_event({"v": value})
+        assert decode_event(record[4:])["v"] == value
+        assert len(record) == 4 + 3 + size  # length prefix, map header and key "v"
+
+def test_writer_survives_a_failed_batch(tmp_path):
+    path = str(tmp_path / "turns.bin")
+    log = TurnLogWriter(path, flush_interval=0.01)
+    log.log({"turn": 1})
+    # each event gets its own batch: the unencodable one must not take the others with it
+    time.sleep(0.1)
+    log.log({"turn": Unencodable()})
+    time.sleep(0.1)
+    log.log({"turn": 3})
+    log.close()
+    assert [e["turn"] for e in iter_turn_events(path)] == [1, 3]
+    assert log.dropped == 1 and isinstance(log.last_error, RuntimeError)
@@ -0,0 +1,17 @@
+from vector_index import VectorIndex, expand_query, tokenize
+
+DOCS = [
+    {"isbn": "EXAM", "title": "Cambridge B2 First Trainer", "learning_goal": "exam_preparation"},
+    {"isbn": "TRAVEL", "title": "Spanish for the Road", "topic": "coursebook", "learning_goal": "general"},
+]
+
+def _index():
+    from vector_index import item_text
+    return VectorIndex(DOCS, [item_text(b) for b in DOCS])
+
+def test_expansions_use_indexed_tokens():
+    assert expand_query(tokenize("certificate")) == ["certificate", "exam", "preparation"]
+
+def test_expansion_reaches_a_document():
+    hits = _index().search("help me prepare for my certificate test")
+    assert [b["isbn"] for _, b in hits] == ["EXAM"]
@@ -0,0 +1,296 @@
+import os, queue, struct, sys, threading, time
+from collections import Counter, defaultdict
+from typing import Dict, Any, List, Optional, Iterator
+from utils import LOG_DIR
+
+TURN_LOG_PATH = os.path.join(LOG_DIR, "turns.bin")
+
+# ---------------- Encoding (MessagePack subset) -----------------
+# Records are framed as <u32 little-endian length><msgpack payload>, so any msgpack
+# library can decode a payload and a crash mid-write only loses the last record.
+
+_LEN = struct.Struct("<I")
+
+def _pack(obj: Any, out: List[bytes]):
+    if obj is None:
+        out.append(b"\xc0")
+    elif obj is True:
+        out.append(b"\xc3")
+    elif obj is False:
+        out.append(b"\xc2")
+    elif isinstance(obj, int):
+        if 0 <= obj < 128:
+            out.append(struct.pack("B", obj))
+        elif -32 <= obj < 0:
+            out.append(struct.pack("b", obj))
+        elif obj >= 0:
+            # smallest width that holds the value: timings and quantities mostly take 2-3 bytes
+            if obj < 1 << 8:
+                out.append(b"\xcc" + struct.pack(">B", obj))
+            elif obj < 1 << 16:
+                out.append(b"\xcd" + struct.pack(">H", obj))
+            elif obj < 1 << 32:
+                out.append(b"\xce" + struct.pack(">I", obj))
+            else:
+                out.append(b"\xcf" + struct.pack(">Q", obj))
+        elif obj >= -(1 << 7):
+            out.append(b"\xd0" + struct.pack(">b", obj))
+        elif obj >= -(1 << 15):
+            out.append(b"\xd1" + struct.pack(">h", obj))
+        elif obj >= -(1 << 31):
+            out.append(b"\xd2" + struct.pack(">i", obj))
+        else:
+            out.append(b"\xd3" + struct.pack(">q", obj))
+    elif isinstance(obj, float):
+        out.append(b"\xcb" + struct.pack(">d", obj))
+    elif isinstance(obj, str):
+        b = obj.encode("utf-8")
+        n = len(b)
+        if n < 32:
+            out.append(struct.pack("B", 0xa0 | n))
+        elif n < 256:
+            out.append(b"\xd9" + struct.pack("B", n))
+        elif n < 65536:
+            out.append(b"\xda" + struct.pack(">H", n))
+        else:
+            out.append(b"\xdb" + struct.pack(">I", n))
+        out.append(b)
+    elif isinstance(obj, (list, tuple)):
+        n = len(obj)
+        if n < 16:
+            out.append(struct.pack("B", 0x90 | n))
+        elif n < 65536:
+            out.append(b"\xdc" + struct.pack(">H", n))
+        else:
+            out.append(b"\xdd" + struct.pack(">I", n))
+        for x in obj:
+            _pack(x, out)
+    elif isinstance(obj, dict):
+        n = len(obj)
+        if n < 16:
+            out.append(struct.pack("B", 0x80 | n))
+        elif n < 65536:
+            out.append(b"\xde" + struct.pack(">H", n))
+        else:
+            out.append(b"\xdf" + struct.pack(">I", n))
+        for k, v in obj.items():
+            _pack(str(k), out)
+            _pack(v, out)
+    else:
+        _pack(str(obj), out)
+
+def encode_event(event: Dict[str, Any]) -> bytes:
+    out: List[bytes] = []
+    _pack(event, out)
+    payload = b"".join(out)
+    return _LEN.pack(len(payload)) + payload
+
+_FIXED = {
+    0xcc: ">B", 0xcd: ">H", 0xce: ">I", 0xcf: ">Q",
+    0xd0: ">b", 0xd1: ">h", 0xd2: ">i", 0xd3: ">q",
+    0xca: ">f", 0xcb: ">d",
+}
+
+def _unpack(buf: bytes, pos: int):
+    t = buf[pos]
+    pos += 1
+    if t <= 0x7f:
+        return t, pos
+    if t >= 0xe0:
+        return t - 0x100, pos
+    if 0xa0 <= t <= 0xbf:
+        n = t & 0x1f
+        return buf[pos:pos + n].decode("utf-8"), pos + n
+    if 0x90 <= t <= 0x9f:
+        return _unpack_array(buf, pos, t & 0x0f)
+    if 0x80 <= t <= 0x8f:
+        return _unpack_map(buf, pos, t & 0x0f)
+    if t == 0xc0:
+        return None, pos
+    if t == 0xc2:
+        return False, pos
+    if t == 0xc3:
+        return True, pos
+    if t in _FIXED:
+        fmt = _FIXED[t]
+        return struct.unpack_from(fmt, buf, pos)[0], pos + struct.calcsize(fmt)
+    if t in (0xd9, 0xda, 0xdb):
+        fmt = {0xd9: ">B", 0xda: ">H", 0xdb: ">I"}[t]
+        n = struct.unpack_from(fmt, buf, pos)[0]
+        pos += struct.calcsize(fmt)
+        return buf[pos:pos + n].decode("utf-8"), pos + n
+    if t in (0xdc, 0xdd):
+        fmt = ">H" if t == 0xdc else ">I"
+        n = struct.unpack_from(fmt, buf, pos)[0]
+        return _unpack_array(buf, pos + struct.calcsize(fmt), n)
+    if t in (0xde, 0xdf):
+        fmt = ">H" if t == 0xde else ">I"
+        n = struct.unpack_from(fmt, buf, pos)[0]
+        return _unpack_map(buf, pos + struct.calcsize(fmt), n)
+    raise ValueError(f"unsupported msgpack type byte 0x{t:02x}")
+
+def _unpack_array(buf: bytes, pos: int, n: int):
+    items = []
+    for _ in range(n):
+        x, pos = _unpack(buf, pos)
+        items.append(x)
+    return items, pos
+
+def _unpack_map(buf: bytes, pos: int, n: int):
+    d = {}
+    for _ in range(n):
+        k, pos = _unpack(buf, pos)
+        v, pos = _unpack(buf, pos)
+        d[k] = v
+    return d, pos
+
+def decode_event(payload: bytes) -> Dict[str, Any]:
+    return _unpack(payload, 0)[0]
+
+def iter_turn_events(path: str = TURN_LOG_PATH) -> Iterator[Dict[str, Any]]:
+    """Yield logged turns in write order; a truncated trailing record is ignored."""
+    if not os.path.exists(path):
+        return
+    with open(path, "rb") as f:
+        while True:
+            head = f.read(_LEN.size)
+            if len(head) < _LEN.size:
+                return
+            (n,) = _LEN.unpack(head)
+            payload = f.read(n)
+            if len(payload) < n:
+                return
+            yield decode_event(payload)
+
+# ---------------- Background writer -----------------
+
+class TurnLogWriter:
+    """Non-blocking turn logger: log() only enqueues; a daemon thread encodes and appends in batches.
+
+    The queue is bounded; when the writer falls behind, events are dropped (and
+    counted) rather than stalling the conversation. Batches that fail to encode or
+    write are counted in dropped too, with the error kept in last_error.
+    """
+
+    def __init__(self, path: str = TURN_LOG_PATH, batch_size: int = 64,
+                 flush_interval: float = 0.5, max_queue: int = 10000):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self.last_error: Optional[Exception] = None
+        self._queue: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue(maxsize=max_queue)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._writer = threading.Thread(target=self._run, name="turn-log", daemon=True)
+        self._writer.start()
+
+    def log(self, event: Dict[str, Any]) -> bool:
+        try:
+            self._queue.put_nowait(event)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def close(self):
+        self._queue.put(None)
+        self._writer.join()
+        if self.dropped:
+            print(f"turn log: {self.dropped} events not written to {self.path}"
+                  + (f" (last error: {self.last_error})" if self.last_error else ""), file=sys.stderr)
+
+    def _run(self):
+        with open(self.path, "ab") as f:
+            stopping = False
+            while not stopping:
+                try:
+                    batch = [self._queue.get(timeout=self.flush_interval)]
+                except queue.Empty:
+                    continue
+                while len(batch) < self.batch_size:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                if None in batch:
+                    stopping = True
+                    batch = [e for e in batch if e is not None]
+                if batch:
+                    try:
+                        start = f.tell()
+                        f.write(b"".join(encode_event(e) for e in batch))
+                        f.flush()
+                    except Exception as e:
+                        # a bad event or a full disk costs this batch, not the rest of the session
+                        self.dropped += len(batch)
+                        self.last_error = e
+                        try:
+                            # cut a partially written batch so later records stay framed
+                            f.seek(start)
+                            f.truncate()
+                        except (OSError, ValueError):
+                            pass
+
+# ---------------- Replay: analytics and benchmarks -----------------
+
+def _percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+def summarize(events: Iterator[Dict[str, Any]]) -> Dict[str, Any]:
+    turns = 0
+    sessions = set()
+    intents: Counter = Counter()
+    actions: Counter = Counter()
+    timings: Dict[str, List[float]] = defaultdict(list)
+    units_added = 0
+    for e in events:
+        turns += 1
+        sessions.add(e.get("session_id"))
+        intents[e.get("nlu", {}).get("intent")] += 1
+        actions[e.get("action", {}).get("type")] += 1
+        for stage, us in e.get("timings_us", {}).items():
+            timings[stage].append(us)
+        units_added += sum(q for q in e.get("cart_delta", {}).values() if q > 0)
+    return {
+        "turns": turns,
+        "sessions": len(sessions),
+        "intents": dict(intents.most_common()),
+        "actions": dict(actions.most_common()),
+        "units_added": units_added,
+        "timings_us": {s: {"p50": _percentile(v, 0.5), "p95": _percentile(v, 0.95), "max": max(v)}
+                       for s, v in timings.items()},
+    }
+
+def bench_nlu(events: Iterator[Dict[str, Any]], repeat: int = 5) -> Dict[str, float]:
+    """Re-run logged utterances through NLU + DM to measure the per-turn hot path offline."""
+    from utils import dm_next_action
+    from intent_model import load_intent_model, hybrid_nlu
+    model = load_intent_model()
+    utterances = [e["utterance"] for e in events if e.get("utterance")]
+    samples: List[float] = []
+    for _ in range(repeat):
+        for u in utterances:
+            t0 = time.perf_counter()
+            nlu = hybrid_nlu(u, model)
+            dm_next_action({"last_nlu": nlu, "slots": dict(nlu["slots"])})
+            samples.append((time.perf_counter() - t0) * 1e6)
+    return {"utterances": len(utterances), "p50_us": _percentile(samples, 0.5),
+            "p95_us": _percentile(samples, 0.95)}
+
+if __name__ == "__main__":
+    cmd = sys.argv[1] if len(sys.argv) > 1 else "stats"
+    path = sys.argv[2] if len(sys.argv) > 2 else TURN_LOG_PATH
+    if cmd == "stats":
+        s = summarize(iter_turn_events(path))
+        print(f"Turns: {s['turns']}  Sessions: {s['sessions']}  Units added to carts: {s['units_added']}")
+        print("Intents:", s["intents"])
+        print("Actions:", s["actions"])
+        for stage, t in s["timings_us"].items():
+            print(f"  {stage:<8} p50={t['p50']:.0f}us p95={t['p95']:.0f}us max={t['max']:.0f}us")
+    elif cmd == "bench":
+        print(bench_nlu(iter_turn_events(path)))
+    else:
+        print("usage: python turn_log.py [stats|bench] [path]")
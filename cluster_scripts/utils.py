@@ -1,5 +1,5 @@
-import json, re, csv
-from typing import Dict, Any, List, Optional
+import json, os, re, csv, heapq
+from typing import Dict, Any, List, Optional, Iterable, Iterator, Tuple, Callable
 
 # ---------------- NLU -----------------
 
@@ -11,6 +11,8 @@ LANG_TO_CODE = {
     "english": "en", "german": "de", "french": "fr", "spanish": "es",
     "italian": "it", "chinese": "zh", "japanese": "ja"
 }
+# books_catalog.csv has no stock column; rows without one get this many units
+CSV_DEFAULT_STOCK = 999
 
 def _extract_price(text: str) -> Dict[str, Any]:
     text_l = text.lower()
@@ -128,6 +130,43 @@ def load_catalog(path: str) -> List[Dict[str, Any]]:
     with open(path, "r", encoding="utf-8") as f:
         return json.load(f)
 
+# session logs (turns, cart events); BOOKBOT_LOG_DIR redirects them, e.g. for benchmarks
+LOG_DIR = os.environ.get("BOOKBOT_LOG_DIR", "logs")
+
+CACHE_DIR = "database/.cache"
+# bump when the layout of cached objects changes in a way module mtimes cannot tell
+CACHE_VERSION = 1
+
+def load_cached(name: str, sources: List[str], build: Callable[[], Any], code: Iterable[str] = ()) -> Any:
+    """Return build(), reusing a pickle in CACHE_DIR while the source files are unchanged.
+
+    code lists the modules build() depends on besides this one; editing any of them
+    (or bumping CACHE_VERSION) invalidates the cache like a changed data file does.
+    """
+    import pickle
+    signature = [CACHE_VERSION] + [(p, os.stat(p).st_mtime_ns, os.stat(p).st_size)
+                                   for p in [*sources, __file__, *code]]
+    path = os.path.join(CACHE_DIR, name + ".pickle")
+    try:
+        # the signature is its own first record (plain tuples), checked before the value is
+        # unpickled: a stale value may reference classes that no longer exist
+        with open(path, "rb") as f:
+            if pickle.load(f) == signature:
+                return pickle.load(f)
+    except Exception:
+        pass
+    value = build()
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump(signature, f, protocol=pickle.HIGHEST_PROTOCOL)
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+    except OSError:
+        pass
+    return value
+
 def load_books_csv(path: str) -> List[Dict[str, Any]]:
     rows: List[Dict[str, Any]] = []
     with open(path, newline="", encoding="utf-8") as f:
@@ -145,14 +184,13 @@ def load_books_csv(path: str) -> List[Dict[str, Any]]:
             rows.append(r)
     return rows
 
-def filter_books(catalog: List[Dict[str, Any]],
-                 language: Optional[str] = None,
-                 level: Optional[str] = None,
-                 genre: Optional[str] = None,
-                 fmt: Optional[str] = None,
-                 price_min: Optional[float] = None,
-                 price_max: Optional[float] = None) -> List[Dict[str, Any]]:
-    results: List[Dict[str, Any]] = []
+def iter_filter_books(catalog: Iterable[Dict[str, Any]],
+                      language: Optional[str] = None,
+                      level: Optional[str] = None,
+                      genre: Optional[str] = None,
+                      fmt: Optional[str] = None,
+                      price_min: Optional[float] = None,
+                      price_max: Optional[float] = None) -> Iterator[Dict[str, Any]]:
     for item in catalog:
         if language and item.get("language","" ).lower() != language.lower():
             continue
@@ -167,19 +205,31 @@ def filter_books(catalog: List[Dict[str, Any]],
             continue
         if price_max is not None and price > price_max:
             continue
-        results.append(item)
-    return results
-
-def rank_books(candidates: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-    return sorted(candidates, key=lambda x: (-float(x.get("rating", 0)), float(x.get("price", 0))))
+        yield item
 
-def filter_books_csv(rows: List[Dict[str, Any]],
-                     language: Optional[str] = None,
-                     level: Optional[str] = None,
-                     genre: Optional[str] = None,
-                     fmt: Optional[str] = None,
-                     price_min: Optional[float] = None,
-                     price_max: Optional[float] = None) -> List[Dict[str, Any]]:
+def filter_books(catalog: List[Dict[str, Any]],
+                 language: Optional[str] = None,
+                 level: Optional[str] = None,
+                 genre: Optional[str] = None,
+                 fmt: Optional[str] = None,
+                 price_min: Optional[float] = None,
+                 price_max: Optional[float] = None) -> List[Dict[str, Any]]:
+    return list(iter_filter_books(catalog, language, level, genre, fmt, price_min, price_max))
+
+def _rank_key(x: Dict[str, Any]) -> Tuple[float, float]:
+    return (-float(x.get("rating", 0)), float(x.get("price", 0)))
+
+def rank_books(candidates: List[Dict[str, Any]],
+               key: Optional[Callable[[Dict[str, Any]], Any]] = None) -> List[Dict[str, Any]]:
+    return sorted(candidates, key=key or _rank_key)
+
+def iter_filter_books_csv(rows: Iterable[Dict[str, Any]],
+                          language: Optional[str] = None,
+                          level: Optional[str] = None,
+                          genre: Optional[str] = None,
+                          fmt: Optional[str] = None,
+                          price_min: Optional[float] = None,
+                          price_max: Optional[float] = None) -> Iterator[Dict[str, Any]]:
     lang_code = None
     if language:
         lang_code = LANG_TO_CODE.get(language.lower())
@@ -195,7 +245,6 @@ def filter_books_csv(rows: List[Dict[str, Any]],
         elif g == "readers":
             # many CSVs may not have readers; leave None to avoid over-filtering
             topic = None
-    results: List[Dict[str, Any]] = []
     for r in rows:
         if lang_code and r.get("language") != lang_code:
             continue
@@ -210,9 +259,91 @@ def filter_books_csv(rows: List[Dict[str, Any]],
             continue
         if price_max is not None and price > price_max:
             continue
-        results.append(r)
+        yield r
+
+def filter_books_csv(rows: List[Dict[str, Any]],
+                     language: Optional[str] = None,
+                     level: Optional[str] = None,
+                     genre: Optional[str] = None,
+                     fmt: Optional[str] = None,
+                     price_min: Optional[float] = None,
+                     price_max: Optional[float] = None) -> List[Dict[str, Any]]:
     # rank similarly
-    return sorted(results, key=lambda x: (-float(x.get("rating", 0)), float(x.get("price", 0))))
+    return sorted(iter_filter_books_csv(rows, language, level, genre, fmt, price_min, price_max), key=_rank_key)
+
+# ---------------- Paged retrieval -----------------
+
+LEVEL_ORDER = ["A1","A2","B1","B2","C1","C2"]
+
+def relaxation_attempts(lang: Optional[str], level: Optional[str], genre: Optional[str],
+                        fmt: Optional[str]) -> List[Tuple[Optional[str], Optional[str], Optional[str], Optional[str]]]:
+    # exact → drop genre → adjacent level(s)
+    attempts = [(lang, level, genre, fmt), (lang, level, None, fmt)]
+    if level in LEVEL_ORDER:
+        idx = LEVEL_ORDER.index(level)
+        neighbors = []
+        if idx - 1 >= 0:
+            neighbors.append(LEVEL_ORDER[idx-1])
+        if idx + 1 < len(LEVEL_ORDER):
+            neighbors.append(LEVEL_ORDER[idx+1])
+        for nb in neighbors:
+            attempts.append((lang, nb, genre, fmt))
+            attempts.append((lang, nb, None, fmt))
+    return attempts
+
+def choose_filters(catalog: List[Dict[str, Any]], slots: Dict[str, Any]) -> Dict[str, Any]:
+    """Pick the first relaxation attempt with any catalog match (exact filters if none match)."""
+    pmin, pmax = slots.get("price_min"), slots.get("price_max")
+    attempts = relaxation_attempts(slots.get("language"), slots.get("level"), slots.get("genre"), slots.get("format"))
+    chosen = attempts[0]
+    for L, Lv, G, F in attempts:
+        if next(iter_filter_books(catalog, L, Lv, G, F, pmin, pmax), None) is not None:
+            chosen = (L, Lv, G, F)
+            break
+    return {"language": chosen[0], "level": chosen[1], "genre": chosen[2], "fmt": chosen[3],
+            "price_min": pmin, "price_max": pmax}
+
+def _ranked_window(items: Iterable[Dict[str, Any]], start: int, stop: int,
+                   key: Optional[Callable[[Dict[str, Any]], Any]] = None) -> List[Dict[str, Any]]:
+    # heapq.nsmallest is stable like sorted(), so consecutive windows never overlap or skip
+    if stop <= start:
+        return []
+    return heapq.nsmallest(stop, items, key=key or _rank_key)[start:]
+
+def fetch_results_page(catalog: List[Dict[str, Any]], csv_rows: List[Dict[str, Any]],
+                       filters: Dict[str, Any], offset: int, limit: int,
+                       key: Optional[Callable[[Dict[str, Any]], Any]] = None) -> List[Dict[str, Any]]:
+    """Return results [offset, offset+limit) of the ranked catalog matches followed by the CSV matches.
+
+    Only offset+limit rows per source are ever held in memory, so deep pages on a
+    broad query cost a streaming pass over the data rather than a full sort.
+    key overrides the default (-rating, price) order, e.g. ranking.ScoreTable.rank_key().
+    """
+    stop = offset + limit
+    n_catalog = sum(1 for _ in iter_filter_books(catalog, **filters))
+    page = _ranked_window(iter_filter_books(catalog, **filters), offset, min(stop, n_catalog), key)
+    csv_start = max(0, offset - n_catalog)
+    csv_stop = stop - n_catalog
+    if csv_stop > csv_start:
+        csv_matches = iter_csv_items(iter_filter_books_csv(csv_rows, **filters)) if key else \
+                      iter_filter_books_csv(csv_rows, **filters)
+        window = _ranked_window(csv_matches, csv_start, csv_stop, key)
+        page += window if key else csv_rows_to_items(window)
+    return page
+
+def iter_results_pages(catalog: List[Dict[str, Any]], csv_rows: List[Dict[str, Any]],
+                       filters: Dict[str, Any], page_size: int,
+                       offset: int = 0,
+                       key: Optional[Callable[[Dict[str, Any]], Any]] = None) -> Iterator[Tuple[int, List[Dict[str, Any]]]]:
+    """Lazily yield (offset, page) pairs; each page is retrieved only when requested."""
+    while True:
+        page = fetch_results_page(catalog, csv_rows, filters, offset, page_size, key)
+        if not page:
+            return
+        yield offset, page
+        offset += len(page)
+        if len(page) < page_size:
+            return
 
 # ---------------- NLG -----------------
 
@@ -236,6 +367,15 @@ def nlg_recommendations(books: List[Dict[str, Any]]) -> str:
     lines.append("Say 'Add 1' to add the first item to cart.")
     return "\n".join(lines)
 
+def format_result_line(idx: int, b: Dict[str, Any]) -> str:
+    fmts = ", ".join(b.get("format", [])) if isinstance(b.get("format"), list) else str(b.get("format"))
+    lang = b.get("language", "").strip()
+    cefr = b.get("cefr", "").strip()
+    genre = b.get("genre", "").strip()
+    price = float(b.get("price", 0))
+    rating = float(b.get("rating", 0))
+    return f"{idx}. {b['title']} — {lang} {cefr} · {genre} · {fmts} · €{price:.2f} (⭐{rating})"
+
 def nlg_recommendations_from_csv(rows: List[Dict[str, Any]]) -> str:
     if not rows:
         return ""
@@ -255,8 +395,8 @@ def nlg_recommendations_from_csv(rows: List[Dict[str, Any]]) -> str:
     lines.append("Say 'Add 1' to add the first item to cart.")
     return "\n".join(lines)
 
-def csv_rows_to_items(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-    items: List[Dict[str, Any]] = []
+def iter_csv_items(rows: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+    import hashlib  # imported on first use, not with utils: it loads OpenSSL, which dominates import time
     for r in rows:
         lang_code = r.get("language", "").lower()
         lang_name = None
@@ -275,8 +415,10 @@ def csv_rows_to_items(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         else:
             genre = "Textbook"
         fmt = (r.get("format") or "").capitalize()
-        isbn = "CSV-" + str(abs(hash(r.get("title","") + r.get("publisher",""))) % 10**10)
-        items.append({
+        # stable across processes so ledger lines and logs can refer to CSV titles
+        digest = hashlib.sha1((r.get("title","") + r.get("publisher","")).encode("utf-8")).hexdigest()
+        isbn = "CSV-" + str(int(digest, 16) % 10**10)
+        yield {
             "isbn": isbn,
             "title": r.get("title") or "Untitled",
             "language": lang_name or "",
@@ -287,9 +429,11 @@ def csv_rows_to_items(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
             "publisher": r.get("publisher") or "",
             "year": 0,
             "rating": float(r.get("rating", 0)),
-            "stock": 999
-        })
-    return items
+            "stock": int(r.get("stock") or CSV_DEFAULT_STOCK)
+        }
+
+def csv_rows_to_items(rows: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return list(iter_csv_items(rows))
 
 def format_csv_lines_with_offset(rows: List[Dict[str, Any]], start_index: int) -> List[str]:
     lines: List[str] = []
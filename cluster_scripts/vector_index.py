@@ -0,0 +1,120 @@
+import heapq, math, re
+from collections import Counter, defaultdict
+from typing import Dict, Any, List, Iterator, Tuple
+from utils import csv_rows_to_items
+
+# ---------------- Text -----------------
+
+_TOKEN = re.compile(r"[^\W_]+", re.UNICODE)
+
+STOPWORDS = {"a","an","and","the","for","to","of","in","on","my","me","i","im","want","need","some","something",
+             "book","books","with","before","after","please","looking","would","like","get","is","it","that","this"}
+
+# Words users say that never appear in catalog fields, mapped to words that do
+QUERY_EXPANSIONS = {
+    "madrid": "spanish", "barcelona": "spanish", "mexico": "spanish", "spain": "spanish",
+    "paris": "french", "france": "french", "lyon": "french",
+    "berlin": "german", "munich": "german", "vienna": "german", "germany": "german", "austria": "german",
+    "rome": "italian", "milan": "italian", "florence": "italian", "italy": "italian",
+    "tokyo": "japanese", "osaka": "japanese", "japan": "japanese",
+    "beijing": "chinese", "shanghai": "chinese", "china": "chinese",
+    "london": "english", "uk": "english",
+    "conversation": "general coursebook", "speaking": "general coursebook", "trip": "general coursebook",
+    "travel": "general coursebook", "holiday": "general coursebook", "beginner": "a1 a2",
+    "exam": "exam_preparation", "test": "exam_preparation", "certificate": "exam_preparation",
+    "university": "academic", "study": "academic",
+    "words": "vocabulary", "vocab": "vocabulary", "textbook": "coursebook", "course": "coursebook",
+}
+
+LANG_NAMES = {"en": "english", "de": "german", "fr": "french", "es": "spanish",
+              "it": "italian", "zh": "chinese", "ja": "japanese"}
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN.findall(text.lower()) if t not in STOPWORDS]
+
+def expand_query(tokens: List[str]) -> List[str]:
+    out: List[str] = []
+    for t in tokens:
+        out.append(t)
+        # tokenized like documents, so "exam_preparation" becomes the indexed "exam", "preparation"
+        out.extend(tokenize(QUERY_EXPANSIONS.get(t, "")))
+    return out
+
+def item_text(item: Dict[str, Any]) -> str:
+    # title, series, topic and learning goal (CSV rows), plus language/level/genre so that
+    # catalog.json items are searchable too
+    lang = item.get("language", "")
+    return " ".join(str(x) for x in (
+        item.get("title", ""), item.get("series", ""), item.get("topic", ""),
+        item.get("learning_goal", ""), LANG_NAMES.get(lang, lang), item.get("cefr", ""),
+        item.get("genre", ""),
+    ) if x)
+
+# ---------------- Index -----------------
+
+class VectorIndex:
+    """In-memory TF-IDF index with cosine top-k search through an inverted index.
+
+    Document vectors are L2-normalized at build time, so a query only touches the
+    postings of its own terms: latency is bounded by query length and term
+    frequency, not by catalog size.
+    """
+
+    def __init__(self, items: List[Dict[str, Any]], texts: List[str]):
+        self.items = items
+        df: Counter = Counter()
+        tfs = []
+        for text in texts:
+            tf = Counter(tokenize(text))
+            tfs.append(tf)
+            df.update(tf.keys())
+        n = len(texts)
+        # smoothed idf as in scikit-learn's TfidfVectorizer
+        self.idf = {t: math.log((1 + n) / (1 + c)) + 1.0 for t, c in df.items()}
+        self.postings: Dict[str, List[Tuple[int, float]]] = defaultdict(list)
+        for doc, tf in enumerate(tfs):
+            weights = {t: (1 + math.log(c)) * self.idf[t] for t, c in tf.items()}
+            norm = math.sqrt(sum(w * w for w in weights.values())) or 1.0
+            for t, w in weights.items():
+                self.postings[t].append((doc, w / norm))
+
+    @classmethod
+    def from_catalogs(cls, catalog: List[Dict[str, Any]], csv_rows: List[Dict[str, Any]]) -> "VectorIndex":
+        # CSV rows are indexed with their raw fields (series, topic, learning_goal), which
+        # csv_rows_to_items drops, but results are the cart-ready items
+        return cls(catalog + csv_rows_to_items(csv_rows), [item_text(b) for b in catalog + csv_rows])
+
+    def _query_vector(self, query: str) -> Dict[str, float]:
+        tf = Counter(t for t in expand_query(tokenize(query)) if t in self.idf)
+        weights = {t: (1 + math.log(c)) * self.idf[t] for t, c in tf.items()}
+        norm = math.sqrt(sum(w * w for w in weights.values())) or 1.0
+        return {t: w / norm for t, w in weights.items()}
+
+    def search(self, query: str, k: int = 5, min_score: float = 0.1) -> List[Tuple[float, Dict[str, Any]]]:
+        return self.search_batch([query], k, min_score)[0]
+
+    def search_batch(self, queries: List[str], k: int = 5,
+                     min_score: float = 0.1) -> List[List[Tuple[float, Dict[str, Any]]]]:
+        """Cosine top-k for several queries; each query gets its own (score, item) list."""
+        results = []
+        for query in queries:
+            scores: Dict[int, float] = defaultdict(float)
+            for t, qw in self._query_vector(query).items():
+                for doc, dw in self.postings[t]:
+                    scores[doc] += qw * dw
+            top = heapq.nlargest(k, ((s, doc) for doc, s in scores.items() if s >= min_score),
+                                 key=lambda sd: (sd[0], -sd[1]))
+            results.append([(s, self.items[doc]) for s, doc in top])
+        return results
+
+def iter_search_pages(index: VectorIndex, query: str, page_size: int,
+                      offset: int = 0) -> Iterator[Tuple[int, List[Dict[str, Any]]]]:
+    """Same (offset, page) contract as utils.iter_results_pages, over semantic hits."""
+    while True:
+        hits = index.search(query, k=offset + page_size)[offset:]
+        if not hits:
+            return
+        yield offset, [b for _, b in hits]
+        offset += len(hits)
+        if len(hits) < page_size:
+            return